@@ -0,0 +1,54 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import argparse
+import time
+
+from fen2pil import draw
+
+from label_chess import pgn2imgs
+
+
+def time_per_position(render, fens, repeat):
+    """Render every position repeat times and return
+    the mean duration per position in ms.
+    """
+    start = time.perf_counter()
+    for _ in range(repeat):
+        for fen in fens:
+            render(fen)
+    return 1000 * (time.perf_counter() - start) / (repeat * len(fens))
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Compare the board renderers on the positions "
+                    "of a pgn file.")
+    parser.add_argument('pgn_path', type=str,
+                        help='Path to a pgn file.')
+    parser.add_argument('-s', '--board_size', type=int, default=480,
+                        help='Width of the board images in pixels.')
+    parser.add_argument('-r', '--repeat', type=int, default=3,
+                        help='Number of renderings of the whole game.')
+    args = parser.parse_args()
+
+    fens = pgn2imgs.pgn_to_fens(args.pgn_path)
+
+    renderer = pgn2imgs.BoardRenderer(args.board_size)
+    results = {
+        "fen2pil": time_per_position(
+            lambda fen: draw.transform_fen_pil(
+                fen=fen, board_size=args.board_size),
+            fens, args.repeat),
+        "numpy renderer": time_per_position(
+            renderer.render, fens, args.repeat),
+    }
+
+    print(f"{len(fens)} positions, {args.board_size}px boards")
+    for name, duration in results.items():
+        speedup = results["fen2pil"] / duration
+        print(f"{name:>15}: {duration:8.2f} ms/position (x{speedup:.1f})")
+
+
+if __name__ == "__main__":
+    main()
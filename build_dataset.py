@@ -0,0 +1,32 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+from label_chess import dataset, models
+import argparse
+import multiprocessing
+
+
+if __name__ == "__main__":
+    # spawned dataset workers of a frozen binary run this entry point
+    multiprocessing.freeze_support()
+    parser = argparse.ArgumentParser(
+        description="Extract the annotated board crops of the database.")
+    parser.add_argument(
+        "output_dir", type=str, help="Directory where the dataset is written.")
+    parser.add_argument(
+        '-a', "--annotations", nargs="+", default=None,
+        help="Names of the annotations to use. Defaults to all.")
+    parser.add_argument(
+        '-w', "--workers", type=int, default=None,
+        help="Number of processes. Defaults to the number of cpus.")
+    parser.add_argument(
+        '-f', "--format", type=str, default="png",
+        help="Image file format of the crops.")
+    args = parser.parse_args()
+
+    models.init_db()
+
+    manifest_path = dataset.build_dataset(
+        args.output_dir, names=args.annotations, workers=args.workers,
+        image_format=args.format)
+    print(f"Dataset manifest written to {manifest_path}.")
@@ -1,10 +1,17 @@
 from builtins import Exception
+from concurrent.futures import ThreadPoolExecutor
+import datetime
+import hashlib
+import itertools
 import pandas as pd
 import os
-from label_chess import models
+import queue
+import threading
+import time
+from label_chess import download, ingest, models, pgn2imgs, storage
 import subprocess
-import requests
 import traceback
+from sqlalchemy import func
 
 def parse_csv(file_path):
     """Load csv file and aggregate meatadata to
@@ -50,7 +57,7 @@ def remove_exists(path):
         os.remove(path)
 
 
-def download_video(url, destination_dir, play_name):
+def download_video(url, destination_dir, play_name, timeout=None):
     """Download video from given url (not tested for other
     than youtube videos). Video is saved under
     destination_dir/play_name.mp4.
@@ -65,143 +72,547 @@ def download_video(url, destination_dir, play_name):
         url (str): video url
         destination_dir (str): directory to save video
         play_name (str): video file name on disk
+        timeout (float, optional): maximum duration of the download
+            in seconds. Defaults to None (no limit).
+
+    Raises:
+        subprocess.CalledProcessError: if youtube-dl fails.
+        subprocess.TimeoutExpired: if the download is too long.
 
     Returns:
         str: path of the downloaded video.
-            None if failure.
     """
     save_path = os.path.join(destination_dir, 
         f"{play_name}.mp4")
 
     remove_exists(save_path)
 
-    cmd = f"youtube-dl {url} "
-    cmd += "--rm-cache-dir --no-part "
-    cmd += f"-o {save_path} "
+    cmd = ["youtube-dl", url]
+    cmd += ["--rm-cache-dir", "--no-part"]
+    cmd += ["-o", save_path]
     # 360p or 480p or 720p (priority order)
-    cmd += "-f 134/135/136"
+    cmd += ["-f", "134/135/136"]
     print(f"Download video {url} to {save_path}")
     try:
-        subprocess.run(cmd, shell=True, capture_output=False)
+        subprocess.run(cmd, capture_output=False, check=True,
+                       timeout=timeout)
     except (Exception, KeyboardInterrupt) as e:
         remove_exists(save_path)
         raise e
     return save_path
 
-def download_file_http(url, save_path):
-    with requests.get(url, stream=True) as r, open(save_path, "wb") as f:
-        for chunk in r.iter_content(chunk_size=1024):
-            f.write(chunk)
-
-def download_pgn(url, destination_dir, play_name):
+def download_pgn(url, destination_dir, play_name, downloader=None):
     """Download pgn file from given url.
 
-    If download is interrupted partial  file is removed.
+    If download is interrupted, the partial file is kept
+    and the next attempt resumes it. A file already downloaded
+    is only downloaded again if it changed on the server.
 
     Args:
         url (str): pgn url
         destination_dir (str): directory to save pgn file
         play_name (str): pgn file name on disk
+        downloader (download.Downloader, optional): downloader
+            sharing its connections across downloads. Defaults to
+            None (a new downloader is used).
 
     Returns:
         str: path of the downloaded pgn.
-            None if failure.
     """
     save_path = os.path.join(destination_dir, 
         f"{play_name}.pgn")
 
-    remove_exists(save_path)
     print(f"Download pgn {url} to {save_path}")
-    
-    try:
-        download_file_http(url, save_path)
-    except (Exception, KeyboardInterrupt) as e :
-        remove_exists(save_path)
-        raise e
+    if downloader is None:
+        downloader = download.Downloader()
+    downloader.download(url, save_path)
 
     return save_path
 
-def exists_in_db(url, name, data_type):
-    """Check if file url or name is already
-    in database.
+def retry(func, retries, backoff, *args, **kwargs):
+    """Call a function until it succeeds, waiting
+    backoff * 2 ** attempt seconds between two attempts.
 
     Args:
-        url (str)
-        name (str)
+        func (callable)
+        retries (int): number of retries after the first failure.
+        backoff (float): base waiting time in seconds.
+
+    Returns:
+        the result of func
+    """
+    for attempt in range(retries + 1):
+        try:
+            return func(*args, **kwargs)
+        except Exception:
+            if attempt == retries:
+                raise
+            traceback.print_exc()
+            time.sleep(backoff * 2 ** attempt)
+
+
+def job_key(video_url, pgn_url):
+    """Identifier of a game in the ingest ledger.
     """
-    db = models.get_db()
-    urls = db.query(data_type.url).all()
-    names = db.query(data_type.name).all()
+    return hashlib.sha1(f"{video_url}\n{pgn_url}".encode("utf-8")).hexdigest()
 
-    urls = {e[0] for e in urls}
-    names = {e[0] for e in names}
 
-    return url in urls or name in names
+class IngestLedger():
+    def __init__(self):
+        """Record of the ingest jobs, persisted in the
+        ingest_job table so that a run can skip the games
+        ingested by previous runs and resume the games
+        they left unfinished.
 
-def add_to_db(obj, original_path, db_path):
-        """Add file object to db.
-        Copy file to app storage.
+        Updates are serialized, each in its own short
+        transaction.
+        """
+        self.lock = threading.Lock()
+
+    def get(self, keys):
+        """Get jobs from the ledger.
 
         Args:
-            obj (models.*): ORM object
-            original_path (str): path to the video file
-            db_path (str): path where to copy the video
-                file.
+            keys (list): job keys
+
+        Returns:
+            dict: attributes of the known jobs, by key.
         """
-        db = models.get_db()
-        db.add(obj)
-        db.commit()
+        jobs = {}
+        with models.session_scope() as db:
+            for i in range(0, len(keys), models.MAX_QUERY_PARAMS):
+                query = db.query(models.IngestJob).filter(
+                    models.IngestJob.key.in_(
+                        keys[i: i + models.MAX_QUERY_PARAMS]))
+                jobs.update({job.key: models.todict(job) for job in query})
+        return jobs
+
+    def add(self, jobs):
+        """Add jobs to the ledger.
 
-def add_job(video_url, pgn_url , game_id):
-    """Download pgn and video file and add them to
-    the app's database.
+        Args:
+            jobs (list): dicts of IngestJob attributes
+        """
+        with self.lock, models.session_scope() as db:
+            models.bulk_insert(db, models.IngestJob, jobs)
+
+    def update(self, key, db=None, **values):
+        """Update a job. If a session is given, the update is
+        part of its transaction and isn't committed.
+        """
+        if db is not None:
+            db.query(models.IngestJob).filter_by(key=key).update(
+                values, synchronize_session=False)
+            return
+        with self.lock, models.session_scope() as db:
+            db.query(models.IngestJob).filter_by(key=key).update(
+                values, synchronize_session=False)
+
+    def summary(self):
+        """Number of jobs per status.
+
+        Returns:
+            dict
+        """
+        with models.session_scope() as db:
+            counts = db.query(models.IngestJob.status,
+                              func.count(models.IngestJob.key)) \
+                .group_by(models.IngestJob.status).all()
+        return dict(counts)
+
+
+class IngestScheduler():
+    def __init__(self, video_workers=2, pgn_workers=4, batch_size=20,
+                 timeout=None, retries=2, backoff=5., chunk_size=1024 ** 2,
+                 proxy=False):
+        """Download games (video and pgn) and add them to the
+        app's database.
+
+        Videos and pgn files are downloaded and indexed by two
+        bounded pools of worker threads, so that the downloads
+        of different games overlap. A single writer thread
+        adds the downloaded games to the database and commits
+        them in batches.
+
+        The state of each game is recorded in the ingest ledger:
+        games ingested by a previous run are skipped and the
+        downloads that succeeded are reused.
+
+        Args:
+            video_workers (int, optional): number of concurrent video
+                downloads. Defaults to 2.
+            pgn_workers (int, optional): number of concurrent pgn
+                downloads. Defaults to 4.
+            batch_size (int, optional): number of games per database
+                commit. Defaults to 20.
+            timeout (float, optional): timeout of one download in
+                seconds. Defaults to None (no limit).
+            retries (int, optional): number of retries of a failed
+                download. Defaults to 2.
+            backoff (float, optional): base waiting time between two
+                attempts in seconds, doubled at each retry.
+                Defaults to 5.
+            chunk_size (int, optional): size of the chunks written to
+                disk by the pgn downloads in bytes. Defaults to 1MiB.
+            proxy (bool, optional): build the low resolution proxies
+                of the videos navigated by the annotator.
+                Defaults to False.
+        """
+        self.video_workers = video_workers
+        self.pgn_workers = pgn_workers
+        self.batch_size = batch_size
+        self.timeout = timeout
+        self.retries = retries
+        self.backoff = backoff
+        self.proxy = proxy
+        # pgn files are downloaded through a shared pool of connections
+        self.downloader = download.Downloader(
+            chunk_size=chunk_size, pool_size=pgn_workers, timeout=timeout)
+        self.ledger = IngestLedger()
+
+        # downloaded games waiting to be written to the database
+        self.downloaded = queue.Queue()
+        # files fetched in this run, by stage and url, shared by
+        # the jobs with the same video or pgn file
+        self.fetched = {}
+        self.lock = threading.Lock()
+        self.counts = {"succeeded": 0, "failed": 0, "skipped": 0}
+        self.nb_jobs = 0
+
+    def run(self, jobs):
+        """Ingest games and print a summary.
+
+        Args:
+            jobs (iterable): (video_url, pgn_url, play_id) tuples
+        """
+        start = time.time()
+        writer = threading.Thread(target=self.write)
+        writer.start()
+
+        # jobs already scheduled in this run
+        scheduled = set()
+        pools = {"video": ThreadPoolExecutor(self.video_workers),
+                 "pgn": ThreadPoolExecutor(self.pgn_workers)}
+        futures = []
+        try:
+            for job in self.load_jobs(jobs):
+                self.nb_jobs += 1
+                if job["key"] in scheduled or \
+                        job["status"] in ("done", "skipped"):
+                    print(f"Skipping {job['game_id']}, already ingested.")
+                    self.count("skipped")
+                    continue
+                scheduled.add(job["key"])
+
+                job["pending"] = 2
+                for stage, pool in pools.items():
+                    futures.append(
+                        pool.submit(self.run_stage, job, stage))
+            for pool in pools.values():
+                pool.shutdown()
+        except BaseException:
+            # drop the downloads that didn't start, the ledger
+            # keeps their jobs pending for the next run
+            for future in futures:
+                future.cancel()
+            for pool in pools.values():
+                pool.shutdown()
+            raise
+        finally:
+            # let the writer commit the downloaded games and stop
+            self.downloaded.put(None)
+            writer.join()
+            self.downloader.close()
+            self.print_summary(time.time() - start)
+
+    def load_jobs(self, jobs, chunk_size=500):
+        """Get jobs from the ledger, adding the games that
+        were never ingested. Jobs are resolved by chunks, with a
+        few queries per chunk rather than a few per job.
+
+        The game id is the play id suffixed by the beginning
+        of the job key, so that it is unique and stays the same
+        across runs.
+
+        Args:
+            jobs (iterable): (video_url, pgn_url, play_id) tuples
+            chunk_size (int, optional): number of jobs resolved
+                together. Defaults to 500.
+
+        Yields:
+            dict: job attributes
+        """
+        jobs = iter(jobs)
+        while True:
+            chunk = [tuple(job) for job in itertools.islice(jobs, chunk_size)]
+            if not chunk:
+                return
+            keys = [job_key(video_url, pgn_url)
+                    for video_url, pgn_url, _ in chunk]
+            known = self.ledger.get(keys)
+
+            new = {}
+            for key, (video_url, pgn_url, play_id) in zip(keys, chunk):
+                if key not in known and key not in new:
+                    new[key] = {"key": key, "video_url": video_url,
+                                "pgn_url": pgn_url,
+                                "game_id": f"{play_id}.{key[:8]}",
+                                "status": "pending", "attempts": 0}
+            # jobs left unfinished by a previous run may have had
+            # their files added since, by jobs sharing them
+            retried = [job for job in known.values()
+                       if job["status"] not in ("done", "skipped")]
+            for job in self.skip_existing(retried):
+                self.ledger.update(job["key"], status="skipped")
+            if new:
+                self.skip_existing(list(new.values()))
+                self.ledger.add(list(new.values()))
+                known.update(self.ledger.get(list(new)))
+
+            for key in keys:
+                yield dict(known[key])
+
+    def skip_existing(self, jobs):
+        """Mark as skipped the jobs whose video and pgn file
+        are both in the database already, added without the
+        ledger or by other jobs sharing them.
+
+        Args:
+            jobs (list): dicts of IngestJob attributes
+
+        Returns:
+            list: the skipped jobs
+        """
+        with models.session_scope() as db:
+            videos = models.files_exist(
+                db, models.Video,
+                [(job["video_url"], f"{job['game_id']}.mp4") for job in jobs])
+            pgns = models.files_exist(
+                db, models.PGN,
+                [(job["pgn_url"], f"{job['game_id']}.pgn") for job in jobs])
+        skipped = []
+        for job, video, pgn in zip(jobs, videos, pgns):
+            if video and pgn:
+                job["status"] = "skipped"
+                skipped.append(job)
+        return skipped
+
+    def run_stage(self, job, stage):
+        """Run one stage of a job with retries. Once both
+        download stages of a job are done, the job is passed
+        to the database writer.
+        """
+        fetch = {"video": self.fetch_video, "pgn": self.fetch_pgn}[stage]
+
+        def attempt():
+            self.ledger.update(
+                job["key"], stage=stage, status="running",
+                attempts=models.IngestJob.attempts + 1,
+                started_at=func.coalesce(
+                    models.IngestJob.started_at, datetime.datetime.now()))
+            fetch(job)
 
-    Args:
-        video_url (str)
-        pgn_url (str)
-        game_id (str)
-    """
-    video_exists = exists_in_db(
-        url=video_url, name=game_id, data_type=models.Video)
-
-    pgn_exists = exists_in_db(
-        url=pgn_url, name=game_id, data_type=models.PGN)
-
-    if not( video_exists or pgn_exists):
-
-        video_path = download_video(video_url, models.VIDEO_DATA_DIR, game_id)
-        pgn_path = download_pgn(pgn_url, models.PGN_DATA_DIR, game_id)
-
-        video = models.Video(
-            url = video_url,
-            original_path = "",
-            path=video_path,
-            name=f"{game_id}.mp4"
-        )
-        pgn = models.PGN(
-            url = pgn_url,
-            original_path = "",
-            path=pgn_path,
-            name=f"{game_id}.pgn"
-        )
-
-        db = models.get_db()
-        db.add(video)
-        db.add(pgn)
-        db.commit()
-
-
-# TODO: parallelize
-def run_jobs(jobs):
-    for i, (video_url, pgn_url, game_id) in enumerate(jobs):
-        print(f"Adding {game_id}.")
-        game_id = f"{i}.{game_id}"
         try:
-            add_job(video_url, pgn_url, game_id)
-            print(f"--- Succeeded")
-        except (Exception, KeyboardInterrupt) :
+            retry(attempt, self.retries, self.backoff)
+        except (Exception, KeyboardInterrupt) as e:
             traceback.print_exc()
-            print(f"--- Failed")
+            job["failed"] = True
+            self.ledger.update(job["key"], stage=stage, error=repr(e))
+
+        with self.lock:
+            job["pending"] -= 1
+            done = job["pending"] == 0
+        if not done:
+            return
+        if job.get("failed"):
+            print(f"--- Failed {job['game_id']}")
+            self.count("failed")
+            self.ledger.update(job["key"], status="failed")
+        else:
+            self.downloaded.put(job)
+
+    def fetch_once(self, stage, url, fetch):
+        """Fetch a file once per run: the jobs sharing a video or
+        a pgn file wait for the first job fetching it and reuse its
+        result. A failed fetch is attempted again by the next job.
+
+        Args:
+            stage (str): "video" or "pgn"
+            url (str)
+            fetch (callable): returns the fetched file
+
+        Returns:
+            the result of fetch
+        """
+        with self.lock:
+            entry = self.fetched.setdefault(
+                (stage, url), {"lock": threading.Lock()})
+        with entry["lock"]:
+            if "result" not in entry:
+                entry["result"] = fetch()
+            return entry["result"]
+
+    def fetch_video(self, job):
+        """Download the video of a job to the app storage, unless
+        it is in the database already, or a previous run or another
+        job downloaded it, and build its keyframe index.
+        """
+        def fetch():
+            with models.session_scope() as db:
+                if db.query(models.Video).get(job["video_url"]) is not None:
+                    return None
+            video_path = job.get("video_path")
+            if video_path and os.path.exists(video_path):
+                blob = storage.stored_blob(video_path)
+            else:
+                video_path = download_video(
+                    job["video_url"], models.VIDEO_DATA_DIR, job["game_id"],
+                    timeout=self.timeout)
+                blob = storage.store_file(video_path, move=True)
+            video = models.Video(
+                url=job["video_url"],
+                original_path="",
+                path=blob["path"],
+                digest=blob["digest"],
+                name=f"{job['game_id']}.mp4"
+            )
+            return blob, video, ingest.build_video_index(video, self.proxy)
+
+        # None if the video is in the database already
+        job["video"] = self.fetch_once("video", job["video_url"], fetch)
+        if job["video"] is not None:
+            self.ledger.update(job["key"], video_path=job["video"][0]["path"])
+
+    def fetch_pgn(self, job):
+        """Download the pgn file of a job to the app storage,
+        unless it is in the database already, or a previous run or
+        another job downloaded it, and parse its games.
+        """
+        def fetch():
+            with models.session_scope() as db:
+                if db.query(models.PGN).get(job["pgn_url"]) is not None:
+                    return None
+            pgn_path = job.get("pgn_path")
+            if pgn_path and os.path.exists(pgn_path):
+                blob = storage.stored_blob(pgn_path)
+            else:
+                pgn_path = download_pgn(
+                    job["pgn_url"], models.PGN_DATA_DIR, job["game_id"],
+                    downloader=self.downloader)
+                blob = storage.store_file(pgn_path, move=True)
+                self.downloader.forget(pgn_path)
+            pgn = models.PGN(
+                url=job["pgn_url"],
+                original_path="",
+                path=blob["path"],
+                digest=blob["digest"],
+                name=f"{job['game_id']}.pgn"
+            )
+            return blob, pgn, list(
+                pgn2imgs.index_pgn_games(pgn.path, with_fens=True))
+
+        # None if the pgn file is in the database already
+        job["pgn"] = self.fetch_once("pgn", job["pgn_url"], fetch)
+        if job["pgn"] is not None:
+            self.ledger.update(job["key"], pgn_path=job["pgn"][0]["path"])
+
+    def write(self):
+        """Database writer loop. Commit the downloaded games
+        in batches of batch_size, until None is received.
+        The writer thread has its own session.
+        """
+        db = models.SCOPED_SESSION()
+        batch = []
+        while True:
+            job = self.downloaded.get()
+            if job is not None:
+                batch.append(job)
+            if batch and (job is None or len(batch) >= self.batch_size):
+                self.commit(db, batch)
+                batch = []
+            if job is None:
+                break
+        models.SCOPED_SESSION.remove()
+
+    def add_job(self, db, job):
+        """Add a downloaded game to the session and mark
+        its job as done in the same transaction. Files shared
+        with a job added before are only added once.
+        """
+        if job["video"] is not None:
+            blob, video, index = job["video"]
+            if db.query(models.Video).get(video.url) is None:
+                storage.add_blob(db, blob)
+                db.add(video)
+                db.add(index)
+        if job["pgn"] is not None:
+            blob, pgn, games = job["pgn"]
+            if db.query(models.PGN).get(pgn.url) is None:
+                storage.add_blob(db, blob)
+                db.add(pgn)
+                ingest.index_pgn(db, pgn, games)
+        self.ledger.update(job["key"], db=db, stage="database",
+                           status="done", error=None,
+                           finished_at=datetime.datetime.now())
+
+    def commit(self, db, batch):
+        """Add a batch of downloaded games to the database.
+        If the batch can't be committed, games are committed
+        one at a time so that a single failing game doesn't
+        discard the others.
+        """
+        try:
+            for job in batch:
+                self.add_job(db, job)
+            db.commit()
+            for job in batch:
+                print(f"--- Succeeded {job['game_id']}")
+                self.count("succeeded")
+        except Exception as e:
+            traceback.print_exc()
+            db.rollback()
+            if len(batch) > 1:
+                for job in batch:
+                    self.commit(db, [job])
+            else:
+                print(f"--- Failed {batch[0]['game_id']}")
+                self.count("failed")
+                self.ledger.update(batch[0]["key"], stage="database",
+                                   status="failed", error=repr(e))
+            return
+        self.print_progress()
+
+    def count(self, status):
+        with self.lock:
+            self.counts[status] += 1
+
+    def print_progress(self):
+        done = sum(self.counts.values())
+        print(f"Progress: {done}/{self.nb_jobs} games, "
+              f"{self.counts['succeeded']} added, "
+              f"{self.counts['failed']} failed, "
+              f"{self.counts['skipped']} skipped.")
+
+    def print_summary(self, duration):
+        print(f"Ingested {self.counts['succeeded']} games in "
+              f"{duration:.0f}s "
+              f"({3600 * self.counts['succeeded'] / max(duration, 1):.1f} "
+              "games/hour).")
+        self.print_progress()
+        summary = ", ".join(
+            f"{count} {status}"
+            for status, count in sorted(self.ledger.summary().items()))
+        print(f"Ledger: {summary}.")
+
+
+def run_jobs(jobs, **kwargs):
+    """Download games and add them to the app's database.
+
+    Args:
+        jobs (iterable): (video_url, pgn_url, play_id) tuples
+        **kwargs: IngestScheduler options
+    """
+    IngestScheduler(**kwargs).run(jobs)
 
 
 def main():
@@ -210,15 +621,46 @@ def main():
     parser = argparse.ArgumentParser(description='Add games to db.')
     parser.add_argument('csv_path', type=str, 
                         help='Path to games list.')
+    parser.add_argument('-n', '--limit', type=int, default=None,
+                        help='Only ingest the first games of the list.')
+    parser.add_argument('--video_workers', type=int, default=2,
+                        help='Number of concurrent video downloads.')
+    parser.add_argument('--pgn_workers', type=int, default=4,
+                        help='Number of concurrent pgn downloads.')
+    parser.add_argument('--batch_size', type=int, default=20,
+                        help='Number of games per database commit.')
+    parser.add_argument('--timeout', type=float, default=None,
+                        help='Timeout of one download in seconds.')
+    parser.add_argument('--retries', type=int, default=2,
+                        help='Number of retries of a failed download.')
+    parser.add_argument('--backoff', type=float, default=5.,
+                        help='Base waiting time between two attempts '
+                             'in seconds, doubled at each retry.')
+    parser.add_argument('--chunk_size', type=int, default=1024 ** 2,
+                        help='Size of the chunks written to disk by the '
+                             'pgn downloads in bytes.')
+
+    parser.add_argument('--proxy', default=False, action='store_true',
+                        help='Build the low resolution proxies of the '
+                             'videos navigated by the annotator.')
 
     args = parser.parse_args()
 
     df = parse_csv(args.csv_path)
-    df = df.iloc[:3] 
+    if args.limit is not None:
+        df = df.iloc[:args.limit]
 
     jobs = ( df.iloc[i]  for i in range(len(df)))
 
-    run_jobs(jobs)
+    run_jobs(jobs,
+             video_workers=args.video_workers,
+             pgn_workers=args.pgn_workers,
+             batch_size=args.batch_size,
+             timeout=args.timeout,
+             retries=args.retries,
+             backoff=args.backoff,
+             chunk_size=args.chunk_size,
+             proxy=args.proxy)
 
 
 if __name__ == "__main__":
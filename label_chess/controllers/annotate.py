@@ -3,8 +3,6 @@
 
 from PIL import Image
 import os
-import shutil
-import pandas as pd
 import json
 
 import tkinter as tk
@@ -12,7 +10,7 @@ from tkinter import filedialog, simpledialog
 from tkinter import messagebox
 import traceback
 
-from label_chess import utils, pgn2imgs
+from label_chess import dataset, ingest, tasks, utils, pgn2imgs
 from label_chess.base import Controller
 from label_chess import views, controllers, models
 
@@ -108,6 +106,20 @@ class ChessFenAnnotatorController(Controller):
         self.bottom_right_x = 100
         self.bottom_right_y = 100
 
+        # memory budget (in bytes) of the cache of decoded
+        # video frames, so that going back and forth between
+        # frames doesn't decode them again
+        self.frame_cache_size = 512 * 1024 ** 2
+        # number of frames decoded in advance by the
+        # background worker while the current frame is displayed
+        self.prefetch_depth = 16
+        # delay (in ms) between two checks of the background
+        # job building the timeline thumbnails
+        self.poll_interval = 200
+        # background job exporting an array dataset, kept
+        # across annotations
+        self.export_task = None
+
         # init variables to keep track of
         # annotations
         self.setup_variables()
@@ -150,6 +162,11 @@ class ChessFenAnnotatorController(Controller):
             command=self.save_frame)
         video_frame.buttons["unsave_frame"].configure(
             command=self.unsave_frame)
+        video_frame.buttons["next_change"].configure(
+            command=self.get_next_change)
+        # jump to the clicked thumbnail of the timeline
+        video_frame.canvases["timeline"].bind(
+            '<Button-1>', self.jump_to_thumbnail)
 
         # bind button to function opening new window
         # to add a new video
@@ -172,9 +189,7 @@ class ChessFenAnnotatorController(Controller):
         pgn_frame = self.view.frames["pgn"]
         # load available pgns from db to option menu
         pgn_frame.buttons["select_pgn"].bind('<Button-1>',
-                                             lambda event: self.populate_menu_buttons(
-                                                 query=models.PGN.name,
-                                                 update_func=pgn_frame.update_pgn_list))
+                                             lambda event: self.populate_pgn_menu())
         # bind postion image navigation button to method
         pgn_frame.buttons["skip_fen"].configure(
             command=self.get_next_fen)
@@ -207,6 +222,9 @@ class ChessFenAnnotatorController(Controller):
 
         self.view.buttons["export_button"].configure(
             command=self.export_annotation)
+        # an export started before the view was reset
+        if self.export_task is not None:
+            self.update_states(caller="export_start")
 
         self.view.buttons["reset_button"].configure(
             command=self.reset_database)
@@ -243,6 +261,8 @@ class ChessFenAnnotatorController(Controller):
                               lambda event: video_btns["unsave_frame"].invoke())
         self.view.master.bind('<space>',
                               lambda event: pgn_btns["skip_fen"].invoke())
+        self.view.master.bind('<Shift-Right>',
+                              lambda event: video_btns["next_change"].invoke())
 
         # bind keyboard events in order to simulate the visual
         # activation of the buttons (flash)
@@ -256,6 +276,8 @@ class ChessFenAnnotatorController(Controller):
             video_btns["unsave_frame"], self.flash_dur), add="+")
         self.view.master.bind('<space>', lambda event: self.flash(
             pgn_btns["skip_fen"], self.flash_dur), add="+")
+        self.view.master.bind('<Shift-Right>', lambda event: self.flash(
+            video_btns["next_change"], self.flash_dur), add="+")
 
     def setup_variables(self):
         """Init/reset the variables used
@@ -276,18 +298,36 @@ class ChessFenAnnotatorController(Controller):
         self.last_bbox = []
         # id of the current chess position
         self.current_fen = -1
-        # list of tuples (fen string, image of chessboard)
+        # sequence of (fen string, image of chessboard),
+        # images are rendered on demand
         self.fens = None
 
-        # generator of frame ids
-        self.frame_generator = None
-
-        # video object
+        # worker decoding the next frames in the background
+        self.prefetcher = None
+        # background job building the timeline thumbnails
+        self.thumbnail_task = None
+        # background job looking for the next board change, and
+        # the frame position it started from
+        self.change_task = None
+        self.change_start = None
+
+        # video object, reading the low resolution proxy
+        # of the video when it exists
         self.video_file = None
+        # path and fps ratio of the navigated video file
+        self.video_path = None
+        self.fps_ratio = 1
+        # keyframe positions of the video file, None if the
+        # video isn't indexed
+        self.keyframes = None
+        # decoded frames of the video, by frame number
+        self.frame_cache = utils.FrameCache(self.frame_cache_size)
 
         # the video and pgn objects used in the current
         # annotation
         self.video, self.pgn = None, None
+        # the game of the pgn file used in the current annotation
+        self.game = None
 
     def populate_menu_buttons(self, query, update_func):
         """Query the database and call a function
@@ -300,11 +340,24 @@ class ChessFenAnnotatorController(Controller):
             update_func (func): function that takes
                 the query result as input.
         """
-        db = models.get_db()
-        names = db.query(query).all()
+        with models.session_scope() as db:
+            names = db.query(query).all()
         names = [e[0] for e in names]
         update_func(names)
 
+    def populate_pgn_menu(self):
+        """Update the content of the pgn option menu
+        with the games available in the database.
+        Games of the pgn files added before games were
+        indexed are indexed first.
+        """
+        with models.session_scope() as db:
+            ingest.index_missing_pgns(db)
+
+        self.populate_menu_buttons(
+            query=models.PGNGame.name,
+            update_func=self.view.frames["pgn"].update_pgn_list)
+
     def get_object_by_name(self, obj, name):
         """Get an object in the database.
         The object must have a name attribute.
@@ -317,8 +370,8 @@ class ChessFenAnnotatorController(Controller):
         Returns:
             type(obj): object found in the database
         """
-        db = models.get_db()
-        obj = db.query(obj).filter_by(name=name).all()
+        with models.session_scope() as db:
+            obj = db.query(obj).filter_by(name=name).all()
         return obj[0]
 
     def start_annotation(self):
@@ -374,12 +427,20 @@ class ChessFenAnnotatorController(Controller):
         # find video in db
         self.video = self.get_object_by_name(
             models.Video, video_name)
+        # navigate the proxy of the video if it was built, frames
+        # are displayed at low resolution anyway
+        with models.session_scope() as db:
+            video_path, self.keyframes = ingest.load_playback_video(
+                db, self.video)
 
         # load video
-        self.video_file = utils.load_video(self.video.path)
-        # generate frames
-        self.frame_generator = utils.frame_id_generator(
-            self.video_file, fps_ratio)
+        self.video_path, self.fps_ratio = video_path, fps_ratio
+        self.video_file = utils.load_video(video_path)
+        # decode the next frames in the background
+        self.prefetcher = utils.FramePrefetcher(
+            video_path, fps_ratio, depth=self.prefetch_depth,
+            keyframes=self.keyframes)
+        self.load_thumbnails()
 
         # display frame
         self.get_next_frame()
@@ -387,24 +448,80 @@ class ChessFenAnnotatorController(Controller):
         self.view.master.title(f"Chess video FEN annotator - {video_name}")
         self.update_states(caller="load_video")
 
+    def load_thumbnails(self):
+        """Display the timeline thumbnails of the current video.
+        They are built by a background job the first time the
+        video is annotated, along with its keyframe index if it
+        has none.
+        """
+        with models.session_scope() as db:
+            thumbnails_path = ingest.load_thumbnails_path(db, self.video)
+            indexed = db.query(models.VideoIndex).get(
+                self.video.url) is not None
+        if thumbnails_path is not None:
+            self.view.frames["video"].set_thumbnails(
+                *utils.load_thumbnails(thumbnails_path))
+            return
+
+        video, video_path, keyframes = \
+            self.video, self.video_path, self.keyframes
+        self.thumbnail_task = tasks.BackgroundTask(
+            video.name,
+            lambda progress: ingest.build_missing_thumbnails(
+                video, video_path, keyframes, indexed, progress),
+            obj=video)
+        self.thumbnail_task.start()
+        self.view.after(self.poll_interval, self.poll_thumbnails)
+
+    def poll_thumbnails(self):
+        """Display the thumbnails once the background job
+        is done. Runs periodically on the Tk thread while the
+        job is running.
+        """
+        task = self.thumbnail_task
+        # the annotation was reset
+        if task is None:
+            return
+        if not task.done:
+            self.view.after(self.poll_interval, self.poll_thumbnails)
+            return
+
+        self.thumbnail_task = None
+        if task.result is None:
+            return
+        thumbnails_path, index = task.result
+        with models.session_scope() as db:
+            ingest.add_thumbnails(db, task.obj, thumbnails_path, index)
+        if thumbnails_path is None:
+            return
+        self.view.frames["video"].set_thumbnails(
+            *utils.load_thumbnails(thumbnails_path))
+        if 0 <= self.current_frame < len(self.frames):
+            self.view.frames["video"].show_timeline_position(
+                self.frames[self.current_frame])
+
     def load_pgn(self, pgn_name):
-        """Load a pgn file from the database.
+        """Load a game of a pgn file from the database.
         Create a list of png images for the positions
-        in the pgn file.
+        in the game.
         Display the first png image in the app.
 
         Args:
-            pgn_name (str): name of the pgn file to load
+            pgn_name (str): name of the game to load
                 (database attribute)
         """
-        # find pgn in db
-        self.pgn = self.get_object_by_name(
-            models.PGN, pgn_name)
-
-        # load fens and chessboard representations
-        self.fens = pgn2imgs.get_game_board_images(
-            self.pgn.path,
-        )
+        # find game and pgn in db
+        self.game = self.get_object_by_name(
+            models.PGNGame, pgn_name)
+        with models.session_scope() as db:
+            self.pgn = db.query(models.PGN).get(self.game.pgn_url)
+            # load fens computed at ingest, replay the game
+            # if they aren't stored
+            fens = ingest.load_fens(db, self.game)
+        if fens is None:
+            fens = pgn2imgs.pgn_to_fens(self.pgn.path, self.game.offset)
+        # chessboard representations
+        self.fens = pgn2imgs.BoardImages(fens)
         # display first fen's image
         self.get_next_fen()
 
@@ -423,12 +540,12 @@ class ChessFenAnnotatorController(Controller):
         saved_fens = self.last_saved_fen[1:]
         saved_bboxes = self.last_bbox
 
-        # create a dataframe with one row per save
+        # one row per save
         rows = []
         for fen_id, frame_id, bbox in zip(saved_fens, saved_frames, saved_bboxes):
             # get the fen from the list and keep only
             # the string representation
-            fen = self.fens[fen_id][0]
+            fen = self.fens.get_fen(fen_id)
             # get the frame from the list of frames
             # and get the original frame id (before fps_ratio)
 
@@ -436,44 +553,36 @@ class ChessFenAnnotatorController(Controller):
             # frame = self.frames[frame_id][0]
 
             row = [frame, fen, *bbox]
-            rows.append(row)
-        df = pd.DataFrame(rows, columns=[
-            "frame_id", "fen", "top_left_x", "top_left_y",
-            "bottom_right_x", "bottom_right_y"
-        ])
+            rows.append(dict(zip(ingest.ANNOTATION_COLUMNS, row)))
 
         # Get the list of annotations already in the database
-        db = models.get_db()
-        anns = db.query(models.Annotation).all()
-        csv_files = [e.csv_path for e in anns]
+        with models.session_scope() as db:
+            names = {e[0] for e in db.query(models.Annotation.name)}
 
         # while the answer is already in the db, open a
         # dialog to ask the user for a name for the annotation
-        # file.
         while True:
-            csv_name = simpledialog.askstring(
+            name = simpledialog.askstring(
                 "Annotation Name", "Enter annotation name:", parent=self.view)
 
-            if csv_name is None:
+            if name is None:
                 messagebox.showwarning("Annotation",
                                        "Didn't save annotation.",
                                        parent=self.view)
                 return
-            csv_path = os.path.join(models.ANNOTATIONS_DATA_DIR,
-                                    f"{csv_name}.csv")
-            if csv_path not in csv_files:
+            if name not in names:
                 break
-        # save csv file and create Annotation object
+        # create the Annotation object and its frames
         # in the database
         try:
-            df.to_csv(csv_path, index=False)
             ann = models.Annotation(
                 video_url=self.video.url,
                 pgn_url=self.pgn.url,
-                csv_path=csv_path
+                pgn_game_id=self.game.id,
+                name=name
             )
-            db.add(ann)
-            db.commit()
+            with models.session_scope() as db:
+                ingest.add_annotation(db, ann, rows)
             self.update_states(caller="end_annotation")
 
         except Exception:
@@ -490,16 +599,19 @@ class ChessFenAnnotatorController(Controller):
     def export_annotation(self):
         """Select a subset of the annotations currently
         available in the database and export them in csv
-        format to the directory selected by the user.
+        format, or as an array dataset, to the directory
+        selected by the user.
         """
+        if self.export_task is not None:
+            return
 
         # open a dialog to choose a subset of annotations
         # to export
-        db = models.get_db()
-        anns = db.query(models.Annotation).all()
-        options = [
-            os.path.split(ann.csv_path)[1] for ann in anns]
-        checked_anns = views.export.export_dialog(self.view, options)
+        with models.session_scope() as db:
+            anns = db.query(models.Annotation.name).all()
+        options = [name for name, in anns]
+        checked_anns, export_format = views.export.export_dialog(
+            self.view, options)
 
         if len(checked_anns) == 0:
             return
@@ -510,38 +622,45 @@ class ChessFenAnnotatorController(Controller):
         if not export_dir:
             return
 
+        if export_format == "npy":
+            self.export_array_dataset(checked_anns, export_dir)
+            return
+
         try:
-            # for each selected annotation file
-            for ann in checked_anns:
-                # path to annotation file in database
-                csv_path = os.path.join(
-                    models.ANNOTATIONS_DATA_DIR,
-                    ann)
-                # path to annotation file in export directory
-                export_csv_path = os.path.join(
-                    export_dir,
-                    ann)
-                # get annotation object in db and get video url
-                # and pgn url
-                annotation = db.query(models.Annotation).filter(
-                    models.Annotation.csv_path == csv_path).one()
-
-                # save metadata
-                meta = {
-                    "csv_file": ann,
-                    "video_url": annotation.video_url,
-                    "pgn_url": annotation.pgn_url
-                }
-
-                json_name = ann.replace(".csv", ".json", 1)
-                export_json_path = os.path.join(
-                    export_dir,
-                    json_name)
-                with open(export_json_path, "w") as meta_file:
-                    json.dump(meta, meta_file)
-
-                # copy annotation file to export directory
-                shutil.copy(csv_path, export_csv_path)
+            with models.session_scope() as db:
+                # for each selected annotation
+                for ann in checked_anns:
+                    # path to annotation file in export directory
+                    export_csv_path = os.path.join(
+                        export_dir,
+                        f"{ann}.csv")
+                    # get annotation object in db and get video url
+                    # and pgn url
+                    annotation = db.query(models.Annotation).filter(
+                        models.Annotation.name == ann).one()
+
+                    # save metadata
+                    meta = {
+                        "csv_file": f"{ann}.csv",
+                        "video_url": annotation.video_url,
+                        "pgn_url": annotation.pgn_url
+                    }
+                    # position of the game in the pgn file
+                    if annotation.pgn_game_id is not None:
+                        game = db.query(models.PGNGame).get(
+                            annotation.pgn_game_id)
+                        meta["pgn_game"] = game.number
+
+                    json_name = f"{ann}.json"
+                    export_json_path = os.path.join(
+                        export_dir,
+                        json_name)
+                    with open(export_json_path, "w") as meta_file:
+                        json.dump(meta, meta_file)
+
+                    # write the annotation's frames to the export directory
+                    ingest.export_annotation_csv(
+                        db, annotation, export_csv_path)
 
         except Exception:
             traceback.print_exc()
@@ -556,6 +675,50 @@ class ChessFenAnnotatorController(Controller):
                             f"to {export_dir}",
                             parent=self.view)
 
+    def export_array_dataset(self, names, export_dir):
+        """Export the board crops of annotations to a memory
+        mapped array of fixed size images (see
+        dataset.build_array_dataset), on a worker thread. Its
+        progress is shown on the export button until it is done
+        (see poll_export).
+
+        Args:
+            names (list): names of the annotations to export
+            export_dir (str)
+        """
+        self.export_task = tasks.BackgroundTask(
+            export_dir,
+            lambda progress: dataset.build_array_dataset(
+                export_dir, names=names, progress=progress))
+        self.export_task.start()
+        self.update_states(caller="export_start")
+        self.view.after(self.poll_interval, self.poll_export)
+
+    def poll_export(self):
+        """Show the progress of the export job, and its outcome
+        once it is done. Runs periodically on the Tk thread while
+        the job is running.
+        """
+        task = self.export_task
+        if not task.done:
+            self.view.buttons["export_button"].configure(
+                text=f"EXPORT {task.progress_done}/{task.progress_total}")
+            self.view.after(self.poll_interval, self.poll_export)
+            return
+
+        self.export_task = None
+        self.update_states(caller="export_done")
+        if task.error is not None:
+            messagebox.showwarning("Export annotation",
+                                   "Couldn't export annotation.",
+                                   parent=self.view)
+            return
+
+        messagebox.showinfo("Export annotation",
+                            "Annotation successfully exported "
+                            f"to {task.name}",
+                            parent=self.view)
+
     def reset_database(self):
         models.init_db(clear=True)
 
@@ -586,16 +749,16 @@ class ChessFenAnnotatorController(Controller):
     def update_bbox(self, event=None):
         """
         Update game img sliders bbox value and
-        draw bbox on current image.
+        draw bbox over current image.
         """
         self.load_bbox_coordinates()
-
-        self.previous_frame = self.current_frame
-        self.current_frame -= 1
-        self.get_next_frame(set_previous_frame=False)
+        self.view.frames["video"].draw_bbox(
+            top_left=(self.top_left_x, self.top_left_y),
+            bottom_right=(self.bottom_right_x, self.bottom_right_y)
+        )
 
     def get_next_frame(self, event=None, set_previous_frame=True):
-        """Get next frame from generator and save it to self.frames
+        """Get next frame from the prefetching worker and save it to self.frames
         then replace the current frame with the new frame.
         If self.current_frame is in (-1; len(self.frames)-1) then
         take the frame from the list of already generated frames.
@@ -609,23 +772,14 @@ class ChessFenAnnotatorController(Controller):
             if self.current_frame > -1 and \
                     self.current_frame < len(self.frames):
 
-                # print(len(self.frames))
                 frame_number = self.frames[self.current_frame]
-                last_frame_number = self.frames[self.previous_frame]
 
-                next_img = utils.get_video_frame(
-                    self.video_file, frame_number, last_frame_number)
+                next_img = self.read_frame(frame_number)
                 next_frame = Image.fromarray(next_img)
 
             else:
-                frame_number = next(self.frame_generator)
-
-                last_frame_number = -1
-                if self.previous_frame > 0:
-                    last_frame_number = self.frames[self.previous_frame]
-
-                next_img = utils.get_video_frame(
-                    self.video_file, frame_number, last_frame_number)
+                frame_number, next_img = self.prefetcher.get()
+                self.frame_cache.put(frame_number, next_img)
                 next_frame = Image.fromarray(next_img)
                 self.frames.append(frame_number)
 
@@ -635,6 +789,7 @@ class ChessFenAnnotatorController(Controller):
                 top_left=(self.top_left_x, self.top_left_y),
                 bottom_right=(self.bottom_right_x, self.bottom_right_y)
             )
+            self.view.frames["video"].show_timeline_position(frame_number)
 
         except StopIteration:
             print(traceback.print_exc())
@@ -646,6 +801,112 @@ class ChessFenAnnotatorController(Controller):
 
         self.update_states(caller="next_frame")
 
+    def get_next_change(self, event=None):
+        """Look for the next frame whose area in the bounding box
+        differs from the current frame, on a worker thread, then
+        jump to it (see poll_next_change).
+        """
+        if self.change_task is not None or \
+                not 0 <= self.current_frame < len(self.frames):
+            return
+        frame_number = self.frames[self.current_frame]
+        reference = self.read_frame(frame_number)
+        height, width = reference.shape[:2]
+        x0, y0, x1, y1 = dataset.bbox_to_pixels(
+            [self.top_left_x, self.top_left_y,
+             self.bottom_right_x, self.bottom_right_y], width, height)
+        if x1 <= x0 or y1 <= y0:
+            return
+
+        video_path, fps_ratio, keyframes = \
+            self.video_path, self.fps_ratio, self.keyframes
+        self.change_start = frame_number
+        self.change_task = tasks.BackgroundTask(
+            "next change",
+            lambda progress: utils.find_next_change(
+                video_path, frame_number, reference, (x0, y0, x1, y1),
+                fps_ratio, keyframes=keyframes, progress=progress))
+        self.change_task.start()
+        self.update_states(caller="next_change_start")
+        self.view.after(self.poll_interval, self.poll_next_change)
+
+    def poll_next_change(self):
+        """Jump to the frame found by the next change job once
+        it is done. Runs periodically on the Tk thread while the
+        job is running.
+        """
+        task = self.change_task
+        # the annotation was reset
+        if task is None:
+            return
+        if not task.done:
+            self.view.after(self.poll_interval, self.poll_next_change)
+            return
+
+        self.change_task = None
+        self.update_states(caller="next_change_done")
+        # the frame changed while looking for the next change
+        if not 0 <= self.current_frame < len(self.frames) or \
+                self.frames[self.current_frame] != self.change_start:
+            return
+        if task.result is None:
+            label = self.view.frames["video"].labels["saved"]
+            self.label_popup(
+                label=label, color=self.unsave_color, text="no change",
+                time=self.popup_dur)
+            return
+        self.jump_to_frame(task.result)
+
+    def jump_to_thumbnail(self, event):
+        """Jump to the frame of the clicked timeline thumbnail.
+        """
+        if self.prefetcher is None:
+            return
+        frame_number = \
+            self.view.frames["video"].get_clicked_thumbnail(event)
+        if frame_number is not None:
+            self.jump_to_frame(frame_number)
+
+    def jump_to_frame(self, frame_number):
+        """Continue the video from a frame position. The frames
+        seen after the current one are forgotten, the saved
+        frames are kept.
+
+        Args:
+            frame_number (int): frame position in the video
+        """
+        # the current frame is past the end of self.frames when
+        # the video was read entirely
+        self.current_frame = min(self.current_frame, len(self.frames) - 1)
+        del self.frames[self.current_frame + 1:]
+
+        # decode from the new position in the background
+        self.prefetcher.stop()
+        self.prefetcher = utils.FramePrefetcher(
+            self.video_path, self.fps_ratio, depth=self.prefetch_depth,
+            keyframes=self.keyframes, start=frame_number)
+
+        self.update_states(caller="jump_frame")
+        self.get_next_frame()
+
+    def read_frame(self, frame_number):
+        """Get a frame of the current video. Frames
+        are read from the cache when available,
+        otherwise they are decoded and cached.
+
+        Args:
+            frame_number (int): frame position in the video
+
+        Returns:
+            np.ndarray: RGB frame
+        """
+        frame = self.frame_cache.get(frame_number)
+        if frame is None:
+            frame, = utils.get_video_frames(
+                self.video_file, [frame_number], self.keyframes)
+            self.frame_cache.put(frame_number, frame)
+        return frame
+
     def get_previous_frame(self, event=None):
         """Go back to positions in self.frames
         and display next frame.
@@ -737,9 +998,26 @@ class ChessFenAnnotatorController(Controller):
         """Stop current annotation, reset annotation states
         and reset widgets.
         """
+        self.release_resources()
         self.setup_variables()
         self.bind_view(self.view)
 
+    def release_resources(self):
+        """Cancel the frame prefetching worker, release
+        the video of the current annotation and stop rendering
+        its chessboards.
+        """
+        if self.prefetcher is not None:
+            self.prefetcher.stop()
+        if self.thumbnail_task is not None:
+            self.thumbnail_task.cancel()
+        if self.change_task is not None:
+            self.change_task.cancel()
+        if self.video_file is not None:
+            self.video_file.release()
+        if self.fens is not None:
+            self.fens.close()
+
     def update_states(self, caller):
         """Activation/Deactivation of components. To change state
         of components, methods should call this method. This allows
@@ -771,6 +1049,7 @@ class ChessFenAnnotatorController(Controller):
 
         elif caller == "load_video":
             self.view.frames["video"].activate_button("next_frame")
+            self.view.frames["video"].activate_button("next_change")
             self.view.frames["video"].disable_button("select_video")
             self.view.frames["video"].disable_button("fps_ratio")
 
@@ -787,6 +1066,17 @@ class ChessFenAnnotatorController(Controller):
             self.label_popup(
                 label=label, color=self.save_color, text="frame saved",
                 time=self.popup_dur)
+        elif caller == "jump_frame":
+            self.view.frames["video"].activate_button("next_frame")
+        elif caller == "next_change_start":
+            self.view.frames["video"].disable_button("next_change")
+        elif caller == "next_change_done":
+            self.view.frames["video"].activate_button("next_change")
+        elif caller == "export_start":
+            self.view.disable_button("export_button")
+        elif caller == "export_done":
+            self.view.buttons["export_button"].configure(text="EXPORT")
+            self.view.activate_button("export_button")
         elif caller == "next_frame_empty":
             self.view.frames["video"].disable_button("next_frame")
         elif caller == "next_frame":
@@ -2,18 +2,17 @@
 # -*- coding: utf-8 -*-
 
 import os
-import shutil
 
 from tkinter import filedialog
 from tkinter import messagebox
 
-from label_chess import models
+from label_chess import ingest, models, storage, tasks
 from label_chess.base import Controller
 
 
 class LoaderController(Controller):
     def __init__(self,
-                 data_type, db_dir, add_name="",
+                 data_type, add_name="",
                  file_type=("All Files", "*.*")):
         """Add the logic to the LoaderView view.
 
@@ -26,7 +25,6 @@ class LoaderController(Controller):
         Args:
             data_type (models.*): A class in app.gui.models that represents
                 an object in the database. For instance: models.Video
-            db_dir (str): path to the database directory for the given data type
             add_name (str, optional): must match LoaderView.add_name. Defaults to "".
             file_type (tuple, optional): File type to pass to the askdir
                 dialog to limit the type of file that can be selected.
@@ -34,9 +32,15 @@ class LoaderController(Controller):
         """
         self.view = None
         self.data_type = data_type
-        self.db_dir = db_dir
         self.add_name = add_name
         self.file_type = file_type
+        self.path = ""
+
+        # imports running in the background, by id
+        self.imports = {}
+        self.next_import_id = 0
+        # delay between two updates of the imports progress, in ms
+        self.poll_interval = 200
 
     def bind_view(self, view):
         """Link a view to this controller.
@@ -52,6 +56,10 @@ class LoaderController(Controller):
         self.view.buttons[f"select_{self.add_name}"].configure(
             command=self.select)
         self.view.buttons["Add"].configure(command=self.add_db)
+        self.view.buttons["import_folder"].configure(
+            command=self.import_folder)
+        # imports are cancelled if the window is closed
+        self.view.bind("<Destroy>", self.on_destroy)
 
     def select(self):
         """Open a dialog to select a file on disk,
@@ -70,6 +78,8 @@ class LoaderController(Controller):
     def add_db(self):
         """Add a file to the database based on the
         path selected in select.
+        The file is imported in the background, so that
+        other files can be added in the meantime.
         """
         # check a file is selected
         if not self.path:
@@ -84,40 +94,148 @@ class LoaderController(Controller):
         if url == "":
             url = self.path
 
-        name = os.path.split(self.path)[-1]
-        name = name.replace(" ", "_").lower()
+        name = ingest.file_name(self.path)
 
         # check if a file with the same filename already is
-        # in the database
-        if self.exists_in_db(url, name):
+        # in the database or being imported
+        if self.exists_in_db(url, name) or any(
+                task.obj is not None and
+                (task.obj.url == url or task.obj.name == name)
+                for task in self.imports.values()):
             messagebox.showwarning("Already exists",
                                    f"{self.add_name} "
                                    "already exists in database",
                                    parent=self.view)
             return
 
-        db_path = os.path.join(self.db_dir,
-                               name)
-
         # add file to database
         new_obj = self.data_type(
             url=url,
             original_path=self.path,
-            path=db_path,
             name=name)
 
-        self.persist(new_obj,
-                     original_path=self.path,
-                     db_path=db_path)
-
-        messagebox.showinfo(f"{self.add_name}",
-                            f"{self.add_name} successfully added to database.",
-                            parent=self.view)
+        self.start_import(new_obj, original_path=self.path)
 
         # empty entry and label widgets
         self.view.entries["URL"].delete(0, 'end')
         label = self.view.labels[f"select_{self.add_name}"]
         label.configure(text="")
+        self.path = ""
+
+    def start_import(self, obj, original_path):
+        """Persist a file object on a worker thread and
+        display its progress.
+
+        Args:
+            obj (models.*): ORM object
+            original_path (str): path to the file
+        """
+        proxy = self.build_proxies()
+        self.run_import(tasks.BackgroundTask(
+            obj.name,
+            lambda progress: self.persist(
+                obj, original_path, progress, proxy),
+            obj=obj))
+
+    def import_folder(self):
+        """Import all the videos and pgn files of a folder
+        selected by the user, in the background.
+        """
+        folder = filedialog.askdirectory(parent=self.view)
+        if not folder:
+            return
+        proxy = self.build_proxies()
+
+        def target(progress):
+            found = ingest.discover_files(folder)
+            pairs, unpaired = ingest.pair_files(
+                found[".mp4"], found[".pgn"])
+            added, skipped, failed = ingest.import_files(
+                found[".mp4"] + found[".pgn"], progress=progress,
+                proxy=proxy)
+            return self.folder_summary(
+                added, skipped, failed, pairs, unpaired)
+
+        self.run_import(tasks.BackgroundTask(os.path.basename(folder), target))
+
+    def build_proxies(self):
+        """Whether the proxies of the imported videos are built
+        (see ingest.build_proxy), as checked in the view.
+        """
+        return self.view.bool_vars["build_proxy"].get()
+
+    def folder_summary(self, added, skipped, failed, pairs, unpaired):
+        """Text reporting the result of a folder import.
+        """
+        text = f"{len(added)} files added to database, " \
+               f"{len(pairs)} games with a video and a pgn file."
+        if skipped:
+            text += "\n\nAlready in database, skipped:\n" + \
+                "\n".join(skipped)
+        if failed:
+            text += "\n\nCouldn't be added:\n" + \
+                "\n".join(f"{name}: {error}" for name, error in failed)
+        if unpaired:
+            text += "\n\nWithout a matching video or pgn file:\n" + \
+                "\n".join(os.path.basename(path) for path in unpaired)
+        return text
+
+    def run_import(self, task):
+        """Start an import task and display its progress.
+
+        Args:
+            task (tasks.BackgroundTask)
+        """
+        import_id = self.next_import_id
+        self.next_import_id += 1
+
+        self.imports[import_id] = task
+        cancel_button = self.view.add_import_row(import_id, task.describe())
+        cancel_button.configure(command=task.cancel)
+        task.start()
+
+        # start polling the imports if no other import runs
+        if len(self.imports) == 1:
+            self.view.after(self.poll_interval, self.poll_imports)
+
+    def poll_imports(self):
+        """Update the progress of the imports and report the
+        finished ones. Runs periodically on the Tk thread while
+        imports are running.
+        """
+        for import_id, task in list(self.imports.items()):
+            if not task.done:
+                self.view.update_import_row(import_id, task.describe())
+                continue
+
+            del self.imports[import_id]
+            self.view.remove_import_row(import_id)
+            if task.cancelled:
+                continue
+            if task.error is not None:
+                messagebox.showwarning(
+                    f"{self.add_name}",
+                    f"Couldn't add {task.name} to database.",
+                    parent=self.view)
+            elif task.result is not None:
+                messagebox.showinfo(
+                    f"{self.add_name}", task.result, parent=self.view)
+            else:
+                messagebox.showinfo(
+                    f"{self.add_name}",
+                    f"{task.name} successfully added to database.",
+                    parent=self.view)
+
+        if self.imports:
+            self.view.after(self.poll_interval, self.poll_imports)
+
+    def on_destroy(self, event):
+        """Cancel the running imports when the view is destroyed.
+        """
+        if event.widget is not self.view:
+            return
+        for task in self.imports.values():
+            task.cancel()
 
     def exists_in_db(self, url, name):
         """Check if file url or name is already
@@ -127,29 +245,55 @@ class LoaderController(Controller):
             url (str)
             name (str)
         """
-        db = models.get_db()
-        urls = db.query(self.data_type.url).all()
-        names = db.query(self.data_type.name).all()
+        with models.session_scope() as db:
+            return models.file_exists(db, self.data_type, url, name)
 
-        urls = {e[0] for e in urls}
-        names = {e[0] for e in names}
-
-        return url in urls or name in names
-
-    def persist(self, obj, original_path, db_path):
+    def persist(self, obj, original_path, progress=None, proxy=False):
         """Add file object to db.
-        Copy file to app storage.
+        Store file in the app storage, under its digest:
+        a file already stored isn't copied again. The stored
+        file and its index files are removed if the file object
+        isn't committed.
 
         Args:
             obj (models.*): ORM object
-            original_path (str): path to the video file
-            db_path (str): path where to copy the video
-                file.
+            original_path (str): path to the file
+            progress (callable, optional): called with (stage, done,
+                total) while the file is stored then indexed
+                ("index"). It can raise storage.Cancelled to stop
+                before the file object is committed. Defaults to None.
+            proxy (bool, optional): build the proxy of a video.
+                Defaults to False.
+        """
+        blob = storage.store_file(original_path, progress=progress)
+        obj.path = blob["path"]
+        obj.digest = blob["digest"]
+        try:
+            storage.report(progress, "index", 0, 0)
+            with models.session_scope() as db:
+                storage.add_blob(db, blob)
+                db.add(obj)
+                self.index(db, obj, progress, proxy)
+                # last chance to cancel
+                storage.report(progress, "commit", 0, 0)
+        except BaseException:
+            # the file wasn't added, remove what was written for it
+            ingest.discard_imports([{"blob": blob, "obj": obj}])
+            raise
+
+    def index(self, db, obj, progress=None, proxy=False):
+        """Called before committing a new file object, to
+        add data precomputed from the file to the session.
+        Does nothing by default.
+
+        Args:
+            db (sqlalchemy.orm.Session)
+            obj (models.*): ORM object, its file is already
+                copied to the app storage.
+            progress (callable, optional): see persist.
+            proxy (bool, optional): see persist.
         """
-        shutil.copy(original_path, db_path)
-        db = models.get_db()
-        db.add(obj)
-        db.commit()
+        pass
 
 
 class VideoLoaderController(LoaderController):
@@ -160,10 +304,15 @@ class VideoLoaderController(LoaderController):
         """
         super().__init__(
             data_type=models.Video,
-            db_dir=models.VIDEO_DATA_DIR,
             add_name="video",
             file_type=("MP4 Files", "*.mp4"))
 
+    def index(self, db, obj, progress=None, proxy=False):
+        """Index the keyframes of the new video and
+        build its proxy if asked.
+        """
+        ingest.index_video(db, obj, proxy=proxy, progress=progress)
+
 
 class PGNLoaderController(LoaderController):
     def __init__(self):
@@ -173,6 +322,10 @@ class PGNLoaderController(LoaderController):
         """
         super().__init__(
             data_type=models.PGN,
-            db_dir=models.PGN_DATA_DIR,
             add_name="pgn",
             file_type=("PGN Files", "*.pgn"))
+
+    def index(self, db, obj, progress=None, proxy=False):
+        """Index the games of the new pgn file.
+        """
+        ingest.index_pgn(db, obj)
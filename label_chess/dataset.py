@@ -0,0 +1,359 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+from concurrent.futures import ProcessPoolExecutor
+import csv
+import json
+import multiprocessing
+import os
+
+import cv2
+import numpy as np
+
+from label_chess import ingest, models, pgn2imgs, storage, utils
+
+# columns of the dataset manifest
+MANIFEST_COLUMNS = ["image", "fen", "annotation", "video_url",
+                    "frame_id", "top_left_x", "top_left_y",
+                    "bottom_right_x", "bottom_right_y"]
+
+
+def worker_pool(workers):
+    """Pool of processes extracting the crops. Workers are
+    spawned rather than forked, the datasets are also built from
+    the app, whose Tk and decoding threads can't be forked safely.
+
+    Args:
+        workers (int): number of processes, None for the
+            number of cpus.
+
+    Returns:
+        ProcessPoolExecutor
+    """
+    return ProcessPoolExecutor(
+        workers, mp_context=multiprocessing.get_context("spawn"))
+
+
+def bbox_to_pixels(bbox, width, height):
+    """Convert a bounding box expressed in percentages of the
+    image width and height to pixel coordinates.
+
+    Args:
+        bbox (list): top_left_x, top_left_y, bottom_right_x,
+            bottom_right_y, as stored in the annotations.
+        width (int): image width
+        height (int): image height
+
+    Returns:
+        tuple: x0, y0, x1, y1 such that image[y0:y1, x0:x1]
+            is the content of the bounding box.
+    """
+    top_left_x, top_left_y, bottom_right_x, bottom_right_y = bbox
+    return (int(top_left_x * width / 100), int(top_left_y * height / 100),
+            int(bottom_right_x * width / 100),
+            int(bottom_right_y * height / 100))
+
+
+def crop_bbox(frame, bbox):
+    """Crop a frame to an annotation's bounding box.
+
+    Args:
+        frame (np.ndarray): H x W x 3 image
+        bbox (list): bounding box in percentages (see bbox_to_pixels)
+
+    Returns:
+        np.ndarray: view on the content of the bounding box
+    """
+    height, width = frame.shape[:2]
+    x0, y0, x1, y1 = bbox_to_pixels(bbox, width, height)
+    return frame[y0:y1, x0:x1]
+
+
+def collect_tasks(db, names=None):
+    """Group the saved frames of annotations by video.
+
+    Args:
+        db (sqlalchemy.orm.Session)
+        names (list, optional): names of the annotations to
+            use. Defaults to None (all annotations).
+
+    Returns:
+        list: one task per video, a dict with the video path,
+            url and keyframes index path, and the saved frames
+            of all its annotations, sorted by frame id.
+    """
+    annotations = db.query(models.Annotation) \
+        .filter(models.Annotation.name.isnot(None))
+    if names is not None:
+        annotations = annotations.filter(models.Annotation.name.in_(names))
+
+    tasks = {}
+    for annotation in annotations.all():
+        if annotation.video_url not in tasks:
+            video = db.query(models.Video).get(annotation.video_url)
+            index = db.query(models.VideoIndex).get(annotation.video_url)
+            tasks[annotation.video_url] = {
+                "video_url": video.url,
+                "video_path": video.path,
+                "index_path": index.path if index is not None else None,
+                "frames": []}
+        for frame in ingest.load_annotation_frames(db, annotation):
+            frame["annotation"] = annotation.name
+            tasks[annotation.video_url]["frames"].append(frame)
+
+    for task in tasks.values():
+        task["frames"].sort(key=lambda frame: frame["frame_id"])
+    return list(tasks.values())
+
+
+def iter_task_frames(task):
+    """Decode the frames of a task, in a single forward
+    pass over the video.
+
+    Args:
+        task (dict): see collect_tasks
+
+    Yields:
+        tuple: (saved frame, decoded frame as an RGB np.ndarray).
+            Decoded frames are None if they can't be read.
+    """
+    keyframes = None
+    if task["index_path"] and os.path.exists(task["index_path"]):
+        keyframes, _ = utils.load_video_index(task["index_path"])
+
+    video = utils.load_video(task["video_path"])
+    # frames saved in several annotations are decoded once
+    images = utils.get_video_frames(
+        video, [frame["frame_id"] for frame in task["frames"]], keyframes)
+    yield from zip(task["frames"], images)
+    video.release()
+
+
+def extract_crops(task, output_dir, image_format="png"):
+    """Crop the saved frames of a task to their bounding box
+    and write them to output_dir/images/<annotation>/.
+
+    Args:
+        task (dict): see collect_tasks
+        output_dir (str): dataset directory
+        image_format (str, optional): image file extension.
+            Defaults to "png".
+
+    Returns:
+        list: one manifest row per written crop
+        list: manifest rows, without image, of the frames that
+            couldn't be read or whose bounding box is empty.
+    """
+    rows = []
+    missing = []
+    for frame, image in iter_task_frames(task):
+        crop = None
+        if image is not None:
+            crop = crop_bbox(image, [frame["top_left_x"], frame["top_left_y"],
+                                     frame["bottom_right_x"],
+                                     frame["bottom_right_y"]])
+        if crop is None or crop.size == 0:
+            missing.append({**frame, "video_url": task["video_url"]})
+            continue
+
+        image_path = os.path.join(
+            "images", frame["annotation"],
+            f"{frame['frame_id']:06d}.{image_format}")
+        os.makedirs(os.path.dirname(os.path.join(output_dir, image_path)),
+                    exist_ok=True)
+        cv2.imwrite(os.path.join(output_dir, image_path),
+                    cv2.cvtColor(crop, cv2.COLOR_RGB2BGR))
+
+        rows.append({**frame, "image": image_path,
+                     "video_url": task["video_url"]})
+    return rows, missing
+
+
+def build_dataset(output_dir, names=None, workers=None, image_format="png"):
+    """Write the crops of the saved frames of annotations
+    and a manifest.csv file listing them with their labels.
+    The frames that couldn't be cropped are listed in
+    missing.csv.
+
+    Videos are processed in parallel by a pool of processes,
+    one video per worker at a time.
+
+    Args:
+        output_dir (str): dataset directory
+        names (list, optional): names of the annotations to
+            use. Defaults to None (all annotations).
+        workers (int, optional): number of processes.
+            Defaults to None (number of cpus).
+        image_format (str, optional): Defaults to "png".
+
+    Returns:
+        str: path to the manifest
+    """
+    with models.session_scope() as db:
+        tasks = collect_tasks(db, names)
+
+    os.makedirs(output_dir, exist_ok=True)
+    manifest_path = os.path.join(output_dir, "manifest.csv")
+    missing_path = os.path.join(output_dir, "missing.csv")
+    with worker_pool(workers) as pool, \
+            open(manifest_path, "w", newline="") as manifest_file, \
+            open(missing_path, "w", newline="") as missing_file:
+        writer = csv.DictWriter(manifest_file, fieldnames=MANIFEST_COLUMNS)
+        writer.writeheader()
+        missing_writer = csv.DictWriter(
+            missing_file, fieldnames=MANIFEST_COLUMNS[1:])
+        missing_writer.writeheader()
+        futures = [pool.submit(extract_crops, task, output_dir, image_format)
+                   for task in tasks]
+        for task, future in zip(tasks, futures):
+            rows, missing = future.result()
+            writer.writerows(rows)
+            missing_writer.writerows(missing)
+            print(f"{task['video_url']}: {len(rows)} crops, "
+                  f"{len(missing)} missing.")
+    return manifest_path
+
+
+def write_array_crops(task, images_path, board_size):
+    """Resize the crops of the saved frames of a task and write
+    them to their rows of a memory mapped image array.
+
+    Args:
+        task (dict): see collect_tasks, with the "offset" of its
+            first frame in the array.
+        images_path (str): path to the .npy image array
+        board_size (int): size of the resized crops
+
+    Returns:
+        list: rows of the frames that couldn't be read, left black.
+    """
+    images = np.load(images_path, mmap_mode="r+")
+    missing = []
+    for row, (frame, image) in enumerate(iter_task_frames(task),
+                                         start=task["offset"]):
+        crop = None
+        if image is not None:
+            crop = crop_bbox(image, [
+                frame["top_left_x"], frame["top_left_y"],
+                frame["bottom_right_x"], frame["bottom_right_y"]])
+        if crop is None or crop.size == 0:
+            missing.append(row)
+            continue
+        images[row] = cv2.resize(crop, (board_size, board_size),
+                                 interpolation=cv2.INTER_AREA)
+    images.flush()
+    return missing
+
+
+def build_array_dataset(output_dir, names=None, board_size=128,
+                        workers=None, progress=None):
+    """Write the crops of the saved frames of annotations,
+    resized to board_size x board_size, to a single array so
+    that the dataset can be memory mapped instead of decoding
+    one image file per sample:
+
+    * images.npy: N x board_size x board_size x 3 uint8 RGB crops
+    * labels.npy: N x 64 uint8 piece codes of the fens, first
+      row is the 8th rank (see pgn2imgs.fen_to_codes)
+    * metadata.json: shapes, piece of each code, and the
+      annotation, video, frame and fen of each sample
+
+    Videos are processed in parallel by a pool of processes,
+    each writing its rows directly to the array file.
+
+    Args:
+        output_dir (str): dataset directory
+        names (list, optional): names of the annotations to
+            use. Defaults to None (all annotations).
+        board_size (int, optional): Defaults to 128.
+        workers (int, optional): number of processes.
+            Defaults to None (number of cpus).
+        progress (callable, optional): called with ("export",
+            number of frames written, number of frames) after each
+            video. It can stop the export by raising
+            storage.Cancelled. Defaults to None.
+
+    Returns:
+        str: path to the metadata file
+    """
+    with models.session_scope() as db:
+        tasks = collect_tasks(db, names)
+
+    # rows of the frames of each task
+    nb_samples = 0
+    for task in tasks:
+        task["offset"] = nb_samples
+        nb_samples += len(task["frames"])
+    frames = [frame for task in tasks for frame in task["frames"]]
+
+    os.makedirs(output_dir, exist_ok=True)
+    images_path = os.path.join(output_dir, "images.npy")
+    shape = (nb_samples, board_size, board_size, 3)
+    if nb_samples == 0:
+        np.save(images_path, np.zeros(shape, dtype=np.uint8))
+    else:
+        # allocate the array file, filled by the workers
+        np.lib.format.open_memmap(
+            images_path, mode="w+", dtype=np.uint8, shape=shape).flush()
+
+    labels = np.zeros((nb_samples, 64), dtype=np.uint8)
+    for row, frame in enumerate(frames):
+        labels[row] = pgn2imgs.fen_to_codes(frame["fen"]).ravel()
+    np.save(os.path.join(output_dir, "labels.npy"), labels)
+
+    missing = []
+    nb_written = 0
+    storage.report(progress, "export", nb_written, nb_samples)
+    with worker_pool(workers) as pool:
+        futures = [pool.submit(write_array_crops, task, images_path,
+                               board_size)
+                   for task in tasks]
+        try:
+            for task, future in zip(tasks, futures):
+                missing += future.result()
+                print(f"{task['video_url']}: {len(task['frames'])} crops.")
+                nb_written += len(task["frames"])
+                storage.report(progress, "export", nb_written, nb_samples)
+        except BaseException:
+            # only wait for the videos already being processed
+            for future in futures:
+                future.cancel()
+            raise
+
+    metadata = {
+        "images": "images.npy",
+        "labels": "labels.npy",
+        "shape": list(shape),
+        "pieces": pgn2imgs.PIECES,
+        # rows of the frames that couldn't be read
+        "missing": sorted(missing),
+        "samples": [{"annotation": frame["annotation"],
+                     "video_url": task["video_url"],
+                     "frame_id": frame["frame_id"],
+                     "fen": frame["fen"]}
+                    for task in tasks for frame in task["frames"]]
+    }
+    metadata_path = os.path.join(output_dir, "metadata.json")
+    with open(metadata_path, "w") as metadata_file:
+        json.dump(metadata, metadata_file)
+    return metadata_path
+
+
+def load_array_dataset(dataset_dir):
+    """Load a dataset written by build_array_dataset. Images are
+    memory mapped: slicing them only reads the selected rows.
+
+    Args:
+        dataset_dir (str)
+
+    Returns:
+        np.memmap: images
+        np.ndarray: labels
+        dict: metadata
+    """
+    with open(os.path.join(dataset_dir, "metadata.json")) as metadata_file:
+        metadata = json.load(metadata_file)
+    images = np.load(os.path.join(dataset_dir, metadata["images"]),
+                     mmap_mode="r")
+    labels = np.load(os.path.join(dataset_dir, metadata["labels"]))
+    return images, labels, metadata
@@ -0,0 +1,147 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import hashlib
+import json
+import os
+
+import requests
+from requests.adapters import HTTPAdapter
+
+
+class Downloader():
+    def __init__(self, chunk_size=1024 ** 2, pool_size=10, timeout=None):
+        """Download files over HTTP through a shared pool
+        of connections.
+
+        Interrupted downloads are resumed with a Range request.
+        Files already downloaded are only fetched again if they
+        changed on the server (ETag/Last-Modified). The sha256
+        checksum of each downloaded file is recorded.
+
+        Download state is saved next to the file, in
+        <save_path>.json. The file is written to <save_path>.part
+        and renamed once complete. Callers moving the file away
+        remove its state with forget.
+
+        Args:
+            chunk_size (int, optional): size of the chunks written to
+                disk in bytes. Defaults to 1MiB.
+            pool_size (int, optional): maximum number of connections
+                kept open per host. Defaults to 10.
+            timeout (float, optional): connection and read timeout
+                in seconds. Defaults to None (no limit).
+        """
+        self.chunk_size = chunk_size
+        self.timeout = timeout
+
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=pool_size,
+                              pool_maxsize=pool_size)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+
+    def download(self, url, save_path):
+        """Download a file.
+
+        Args:
+            url (str): file url
+            save_path (str): path where to save the file
+
+        Raises:
+            requests.HTTPError: if the server answers with an error.
+
+        Returns:
+            dict: download metadata: url, etag, last_modified,
+                size, sha256 and fetched (False if the file was
+                already up to date).
+        """
+        part_path = f"{save_path}.part"
+        meta = self.load_meta(save_path)
+
+        headers = {}
+        validator = meta.get("etag") or meta.get("last_modified")
+        if meta.get("complete") and os.path.exists(save_path):
+            # only fetch the file again if it changed
+            if meta.get("etag"):
+                headers["If-None-Match"] = meta["etag"]
+            if meta.get("last_modified"):
+                headers["If-Modified-Since"] = meta["last_modified"]
+        elif os.path.exists(part_path) and validator:
+            # resume the download, the server sends the whole
+            # file if it changed since the first attempt
+            headers["Range"] = f"bytes={os.path.getsize(part_path)}-"
+            headers["If-Range"] = validator
+
+        with self.session.get(url, headers=headers, stream=True,
+                              timeout=self.timeout) as response:
+            if response.status_code == 304:
+                meta["fetched"] = False
+                return meta
+            if response.status_code == 416 and "Range" in headers:
+                # the part file already holds the whole file, the
+                # previous attempt stopped before renaming it:
+                # fetch the whole file again
+                os.remove(part_path)
+                return self.download(url, save_path)
+            response.raise_for_status()
+
+            checksum = hashlib.sha256()
+            mode = "wb"
+            if response.status_code == 206:
+                mode = "ab"
+                with open(part_path, "rb") as part_file:
+                    for chunk in iter(
+                            lambda: part_file.read(self.chunk_size), b""):
+                        checksum.update(chunk)
+
+            meta = {
+                "url": url,
+                "etag": response.headers.get("ETag"),
+                "last_modified": response.headers.get("Last-Modified"),
+                "complete": False
+            }
+            self.save_meta(save_path, meta)
+
+            with open(part_path, mode) as part_file:
+                for chunk in response.iter_content(
+                        chunk_size=self.chunk_size):
+                    part_file.write(chunk)
+                    checksum.update(chunk)
+
+        os.replace(part_path, save_path)
+        meta.update({
+            "size": os.path.getsize(save_path),
+            "sha256": checksum.hexdigest(),
+            "complete": True
+        })
+        self.save_meta(save_path, meta)
+        meta["fetched"] = True
+        return meta
+
+    def load_meta(self, save_path):
+        """Load the download metadata of a file, empty if
+        the file was never downloaded.
+        """
+        try:
+            with open(f"{save_path}.json") as meta_file:
+                return json.load(meta_file)
+        except (FileNotFoundError, ValueError):
+            return {}
+
+    def save_meta(self, save_path, meta):
+        with open(f"{save_path}.json", "w") as meta_file:
+            json.dump(meta, meta_file)
+
+    def forget(self, save_path):
+        """Remove the download metadata of a file moved
+        away from save_path, it can't be checked for changes
+        any more.
+        """
+        try:
+            os.remove(f"{save_path}.json")
+        except FileNotFoundError:
+            pass
+
+    def close(self):
+        self.session.close()
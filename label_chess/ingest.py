@@ -0,0 +1,601 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+from concurrent.futures import ThreadPoolExecutor
+import csv
+import os
+import threading
+
+import numpy as np
+
+from label_chess import models, pgn2imgs, storage, utils
+
+
+# height of the proxy videos navigated by the annotator. Proxies
+# are motion jpeg: they take several times the size of their video.
+PROXY_HEIGHT = 360
+# seconds between two thumbnails of the annotator timeline
+THUMBNAIL_INTERVAL = 10
+# height of the thumbnails of the annotator timeline
+THUMBNAIL_HEIGHT = 72
+
+
+def index_video(db, video, proxy=False, progress=None):
+    """Build the keyframe index of a video, save it to the
+    index directory and add the corresponding database entry
+    to the session.
+
+    Args:
+        db (sqlalchemy.orm.Session)
+        video (models.Video): video whose file is already
+            copied to the app storage.
+        proxy (bool, optional): also build the proxy video (see
+            build_proxy). Defaults to False.
+        progress (callable, optional): see build_video_index.
+            Defaults to None.
+
+    Returns:
+        models.VideoIndex: new index entry
+    """
+    index = build_video_index(video, proxy, progress)
+    db.add(index)
+    return index
+
+
+def build_video_index(video, proxy=False, progress=None):
+    """Build the keyframe index of a video and save it to the
+    index directory. Doesn't need a database session, so that
+    it can run on a worker thread.
+
+    Args:
+        video (models.Video): video whose file is already
+            copied to the app storage.
+        proxy (bool, optional): also build the proxy video (see
+            build_proxy) and the timeline thumbnails, which are
+            cheap to sample from the proxy. Defaults to False.
+        progress (callable, optional): called with (stage, done,
+            total) while the proxy and the thumbnails are built. It
+            can raise storage.Cancelled to stop. Defaults to None.
+
+    Returns:
+        models.VideoIndex: new index entry, not added to
+            any session.
+    """
+    keyframes, timestamps = utils.build_video_index(video.path)
+
+    index_path = os.path.join(models.INDEX_DATA_DIR, f"{video.name}.npz")
+    utils.save_video_index(index_path, keyframes, timestamps)
+
+    proxy_path, thumbnails_path = None, None
+    if proxy:
+        proxy_path = build_proxy(video, len(timestamps), progress)
+    if proxy_path is not None:
+        thumbnails_path = build_thumbnails(
+            video, proxy_path, np.arange(len(timestamps)), progress)
+
+    return models.VideoIndex(
+        video_url=video.url,
+        path=index_path,
+        nb_frames=len(timestamps),
+        nb_keyframes=len(keyframes),
+        proxy_path=proxy_path,
+        thumbnails_path=thumbnails_path
+    )
+
+
+def build_proxy(video, nb_frames=None, progress=None):
+    """Transcode a video to a low resolution motion jpeg
+    proxy, saved to the index directory. Every frame of the
+    proxy is a keyframe, so the annotator can seek to any
+    frame in constant time.
+
+    Args:
+        video (models.Video)
+        nb_frames (int, optional): number of frames of the video.
+            If given, the proxy is discarded when it doesn't have
+            the same number of frames. Defaults to None.
+        progress (callable, optional): see utils.build_proxy_video.
+            Defaults to None.
+
+    Returns:
+        str: path to the proxy, None if it couldn't be built.
+    """
+    proxy_path = os.path.join(models.INDEX_DATA_DIR,
+                              f"{video.name}.proxy.avi")
+    nb_proxy_frames = utils.build_proxy_video(
+        video.path, proxy_path, height=PROXY_HEIGHT, progress=progress)
+    if nb_proxy_frames == 0 or \
+            (nb_frames is not None and nb_proxy_frames != nb_frames):
+        if os.path.exists(proxy_path):
+            os.remove(proxy_path)
+        return None
+    return proxy_path
+
+
+def load_playback_video(db, video):
+    """Get the video file navigated by the annotator: the
+    proxy of the video if it was built, otherwise the video.
+
+    Args:
+        db (sqlalchemy.orm.Session)
+        video (models.Video)
+
+    Returns:
+        str: path to the video file
+        np.ndarray: keyframe positions of the file, None
+            if they aren't known.
+    """
+    index = db.query(models.VideoIndex).get(video.url)
+    if index is not None and index.proxy_path and \
+            os.path.exists(index.proxy_path):
+        # every frame of the proxy is a keyframe
+        return index.proxy_path, np.arange(index.nb_frames)
+    return video.path, load_keyframes(db, video)
+
+
+def build_thumbnails(video, video_path, keyframes=None, progress=None):
+    """Sample the thumbnails of the annotator timeline of
+    a video and save them as a sprite sheet to the index
+    directory. Doesn't need a database session, so that it
+    can run on a worker thread.
+
+    Args:
+        video (models.Video)
+        video_path (str): file the thumbnails are sampled from, the
+            video or its proxy (see load_playback_video).
+        keyframes (np.ndarray, optional): keyframe positions of
+            the file. Defaults to None.
+        progress (callable, optional): see
+            utils.build_thumbnail_sheet. Defaults to None.
+
+    Returns:
+        str: path to the sprite sheet, None if no frame
+            could be read.
+    """
+    sheet, frame_ids, size = utils.build_thumbnail_sheet(
+        video_path, THUMBNAIL_INTERVAL, height=THUMBNAIL_HEIGHT,
+        keyframes=keyframes, progress=progress)
+    if sheet is None:
+        return None
+    thumbnails_path = os.path.join(models.INDEX_DATA_DIR,
+                                   f"{video.name}.thumbs.npz")
+    utils.save_thumbnail_sheet(thumbnails_path, sheet, frame_ids, size)
+    return thumbnails_path
+
+
+def build_missing_thumbnails(video, video_path, keyframes=None,
+                             indexed=True, progress=None):
+    """Build the timeline thumbnails of a video the first time
+    it is annotated (see build_thumbnails). Videos without a
+    keyframe index, added before videos were indexed or whose
+    indexing failed, are indexed first so that their thumbnails
+    can be recorded and are only built once.
+
+    Args:
+        video (models.Video)
+        video_path (str): see build_thumbnails
+        keyframes (np.ndarray, optional): keyframe positions of
+            the file. Defaults to None.
+        indexed (bool, optional): whether the video has an index
+            entry. Defaults to True.
+        progress (callable, optional): see build_thumbnails.
+            Defaults to None.
+
+    Returns:
+        str: path to the sprite sheet, None if no frame
+            could be read.
+        models.VideoIndex: new index entry of a video that wasn't
+            indexed, not added to any session. None otherwise.
+    """
+    index = None
+    if not indexed:
+        index = build_video_index(video)
+        keyframes, _ = utils.load_video_index(index.path)
+    thumbnails_path = build_thumbnails(
+        video, video_path, keyframes, progress)
+    return thumbnails_path, index
+
+
+def load_thumbnails_path(db, video):
+    """Get the path to the sprite sheet of the timeline
+    thumbnails of a video.
+
+    Args:
+        db (sqlalchemy.orm.Session)
+        video (models.Video)
+
+    Returns:
+        str: path to the sprite sheet, None if it isn't built.
+    """
+    index = db.query(models.VideoIndex).get(video.url)
+    if index is None or not index.thumbnails_path or \
+            not os.path.exists(index.thumbnails_path):
+        return None
+    return index.thumbnails_path
+
+
+def add_thumbnails(db, video, thumbnails_path, new_index=None):
+    """Record the sprite sheet of the timeline thumbnails
+    of a video in its index.
+
+    Args:
+        db (sqlalchemy.orm.Session)
+        video (models.Video)
+        thumbnails_path (str): see build_thumbnails
+        new_index (models.VideoIndex, optional): index entry built
+            with the thumbnails of a video that wasn't indexed (see
+            build_missing_thumbnails), added unless the video was
+            indexed since. Defaults to None.
+    """
+    index = db.query(models.VideoIndex).get(video.url)
+    if index is None and new_index is not None:
+        db.add(new_index)
+        index = new_index
+    if index is not None:
+        index.thumbnails_path = thumbnails_path
+
+
+def load_keyframes(db, video):
+    """Get the keyframe positions of a video from
+    its index.
+
+    Args:
+        db (sqlalchemy.orm.Session)
+        video (models.Video)
+
+    Returns:
+        np.ndarray: keyframe positions, None if the video
+            isn't indexed.
+    """
+    index = db.query(models.VideoIndex).get(video.url)
+    if index is None or not os.path.exists(index.path):
+        return None
+    keyframes, _ = utils.load_video_index(index.path)
+    return keyframes
+
+
+def index_pgn(db, pgn, games=None):
+    """Index the games of a pgn file and add one database
+    entry per game to the session, along with the positions
+    of the mainline of each game.
+
+    Args:
+        db (sqlalchemy.orm.Session)
+        pgn (models.PGN): pgn whose file is already copied
+            to the app storage.
+        games (list, optional): games of the file as given by
+            pgn2imgs.index_pgn_games with fens, if already parsed.
+            Defaults to None.
+
+    Returns:
+        list: new models.PGNGame entries
+    """
+    if games is None:
+        games = list(pgn2imgs.index_pgn_games(pgn.path, with_fens=True))
+
+    entries = []
+    for number, game in enumerate(games):
+        name = pgn.name
+        if len(games) > 1:
+            players = f"{game['white'] or '?'} - {game['black'] or '?'}"
+            name = f"{pgn.name} #{number + 1} {players}"
+        headers = {k: v for k, v in game.items() if k != "fens"}
+        entries.append(models.PGNGame(
+            pgn_url=pgn.url, number=number, name=name, **headers))
+    # get the ids of the games
+    models.bulk_add(db, entries)
+
+    positions = (
+        {"game_id": entry.id, "ply": ply, "fen": fen}
+        for entry, game in zip(entries, games)
+        for ply, fen in enumerate(game["fens"])
+    )
+    models.bulk_insert(db, models.Position, positions)
+    return entries
+
+
+def load_fens(db, game):
+    """Get the fens of the positions of a game, ordered
+    chronologically.
+
+    Args:
+        db (sqlalchemy.orm.Session)
+        game (models.PGNGame)
+
+    Returns:
+        list: fens of the positions, None if the positions
+            of the game aren't stored in the database.
+    """
+    fens = db.query(models.Position.fen) \
+        .filter(models.Position.game_id == game.id) \
+        .order_by(models.Position.ply).all()
+    if len(fens) == 0:
+        return None
+    return [fen for fen, in fens]
+
+
+def index_missing_pgns(db):
+    """Index the games of the pgn files added to the
+    database before games were indexed.
+
+    Args:
+        db (sqlalchemy.orm.Session)
+    """
+    indexed = db.query(models.PGNGame.pgn_url)
+    pgns = db.query(models.PGN).filter(models.PGN.url.notin_(indexed))
+    for pgn in pgns.all():
+        index_pgn(db, pgn)
+
+
+# columns of the annotation csv files
+ANNOTATION_COLUMNS = ["frame_id", "fen", "top_left_x", "top_left_y",
+                      "bottom_right_x", "bottom_right_y"]
+
+
+def add_annotation(db, annotation, frames):
+    """Add an annotation and its saved frames to the session.
+
+    Args:
+        db (sqlalchemy.orm.Session)
+        annotation (models.Annotation): new annotation
+        frames (list): dicts with the ANNOTATION_COLUMNS keys,
+            one per saved frame.
+
+    Returns:
+        models.Annotation
+    """
+    # get the id of the annotation
+    models.bulk_add(db, [annotation])
+    models.bulk_insert(
+        db, models.AnnotationFrame,
+        ({"annotation_id": annotation.id, **frame} for frame in frames))
+    return annotation
+
+
+def load_annotation_frames(db, annotation):
+    """Get the saved frames of an annotation, in the order
+    they were saved.
+
+    Args:
+        db (sqlalchemy.orm.Session)
+        annotation (models.Annotation)
+
+    Returns:
+        list: dicts with the ANNOTATION_COLUMNS keys
+    """
+    columns = [getattr(models.AnnotationFrame, column)
+               for column in ANNOTATION_COLUMNS]
+    rows = db.query(*columns) \
+        .filter(models.AnnotationFrame.annotation_id == annotation.id) \
+        .order_by(models.AnnotationFrame.id).all()
+    return [dict(zip(ANNOTATION_COLUMNS, row)) for row in rows]
+
+
+def export_annotation_csv(db, annotation, csv_path):
+    """Write the saved frames of an annotation to a csv file.
+
+    Args:
+        db (sqlalchemy.orm.Session)
+        annotation (models.Annotation)
+        csv_path (str)
+    """
+    with open(csv_path, "w", newline="") as csv_file:
+        writer = csv.DictWriter(csv_file, fieldnames=ANNOTATION_COLUMNS)
+        writer.writeheader()
+        writer.writerows(load_annotation_frames(db, annotation))
+
+
+def index_legacy_annotations(db):
+    """Copy to the annotation_frame table the frames of the
+    annotations saved as csv files before frames were stored in
+    the database, and name them after their csv file. Names
+    already given to another annotation get a numbered suffix.
+
+    Args:
+        db (sqlalchemy.orm.Session)
+    """
+    annotations = db.query(models.Annotation).filter(
+        models.Annotation.name.is_(None),
+        models.Annotation.csv_path.isnot(None))
+    names = {name for name, in db.query(models.Annotation.name).filter(
+        models.Annotation.name.isnot(None))}
+    for annotation in annotations.all():
+        if not os.path.exists(annotation.csv_path):
+            continue
+        with open(annotation.csv_path, newline="") as csv_file:
+            frames = [
+                {column: row[column] if column == "fen"
+                 else int(float(row[column]))
+                 for column in ANNOTATION_COLUMNS}
+                for row in csv.DictReader(csv_file)]
+        models.bulk_insert(
+            db, models.AnnotationFrame,
+            ({"annotation_id": annotation.id, **frame} for frame in frames))
+        base_name = os.path.splitext(
+            os.path.basename(annotation.csv_path))[0]
+        name, suffix = base_name, 1
+        while name in names:
+            suffix += 1
+            name = f"{base_name}_{suffix}"
+        names.add(name)
+        annotation.name = name
+
+
+# file types found by folder imports, by extension
+IMPORT_TYPES = {".mp4": models.Video, ".pgn": models.PGN}
+
+
+def file_name(path):
+    """Name given in the database to an imported file.
+    """
+    return os.path.basename(path).replace(" ", "_").lower()
+
+
+def discover_files(folder):
+    """Find the videos and pgn files of a folder and
+    its sub folders.
+
+    Args:
+        folder (str)
+
+    Returns:
+        dict: sorted paths of the files, by extension
+            (see IMPORT_TYPES)
+    """
+    found = {extension: [] for extension in IMPORT_TYPES}
+    for root, _, names in os.walk(folder):
+        for name in names:
+            extension = os.path.splitext(name)[1].lower()
+            if extension in found:
+                found[extension].append(os.path.join(root, name))
+    return {extension: sorted(paths) for extension, paths in found.items()}
+
+
+def pair_files(video_paths, pgn_paths):
+    """Pair the videos and pgn files of a game, which share
+    the same file name apart from the extension (e.g.
+    round_1_board_2.mp4 and round_1_board_2.pgn).
+
+    Returns:
+        list: (video path, pgn path) pairs
+        list: paths of the files without a pair
+    """
+    def stem(path):
+        return os.path.splitext(file_name(path))[0]
+
+    pgns = {stem(path): path for path in pgn_paths}
+    pairs = [(path, pgns.pop(stem(path)))
+             for path in video_paths if stem(path) in pgns]
+    paired = {path for pair in pairs for path in pair}
+    unpaired = [path for path in video_paths + pgn_paths
+                if path not in paired]
+    return pairs, unpaired
+
+
+def import_files(paths, workers=4, progress=None, proxy=False):
+    """Add videos and pgn files to the database.
+
+    Files are stored and indexed in parallel, then all their
+    rows are added in a single transaction. Files whose url
+    (their path) or name is already in the database are skipped.
+    A file that can't be stored or indexed doesn't stop the
+    others: it is reported as failed and the files written for
+    it are removed.
+
+    Args:
+        paths (list): paths of the files, see IMPORT_TYPES for
+            the supported extensions.
+        workers (int, optional): number of files stored and indexed
+            at the same time. Defaults to 4.
+        progress (callable, optional): called with ("store", files
+            done, total files). It can raise storage.Cancelled to stop
+            before the transaction, nothing is imported then.
+            Defaults to None.
+        proxy (bool, optional): build the proxies of the videos (see
+            build_proxy). Defaults to False.
+
+    Returns:
+        list: names of the added files
+        list: names of the skipped files
+        list: (name, error message) of the failed files
+    """
+    # drop the files already in database, or imported twice
+    new, skipped, names = [], [], set()
+    with models.session_scope() as db:
+        for extension, data_type in IMPORT_TYPES.items():
+            typed_paths = [path for path in paths
+                           if os.path.splitext(path)[1].lower() == extension]
+            exist = models.files_exist(
+                db, data_type,
+                [(path, file_name(path)) for path in typed_paths])
+            for path, found in zip(typed_paths, exist):
+                if found or file_name(path) in names:
+                    skipped.append(file_name(path))
+                    continue
+                names.add(file_name(path))
+                new.append((path, data_type))
+
+    lock = threading.Lock()
+    done = [0]
+
+    def file_progress(*_):
+        # the progress is counted in files, the progress callback
+        # is still called during each file so that it can cancel
+        storage.report(progress, "store", done[0], len(new))
+
+    def prepare(path, data_type):
+        # store the file and precompute its index rows, errors
+        # are kept with the file instead of being raised
+        item = {"name": file_name(path), "blob": None, "obj": None,
+                "index": None, "error": None}
+        try:
+            item["blob"] = storage.store_file(path, progress=file_progress)
+            item["obj"] = data_type(
+                url=path, original_path=path, path=item["blob"]["path"],
+                digest=item["blob"]["digest"], name=file_name(path))
+            if data_type is models.Video:
+                item["index"] = build_video_index(
+                    item["obj"], proxy, file_progress)
+            else:
+                item["index"] = list(pgn2imgs.index_pgn_games(
+                    item["obj"].path, with_fens=True))
+            with lock:
+                done[0] += 1
+                storage.report(progress, "store", done[0], len(new))
+        except Exception as e:
+            item["error"] = e
+        return item
+
+    with ThreadPoolExecutor(workers) as pool:
+        prepared = list(pool.map(lambda item: prepare(*item), new))
+    failed = [item for item in prepared if item["error"] is not None]
+    imported = [item for item in prepared if item["error"] is None]
+
+    try:
+        if any(isinstance(item["error"], storage.Cancelled)
+               for item in failed):
+            raise storage.Cancelled
+        storage.report(progress, "commit", 0, 0)
+        with models.session_scope() as db:
+            for item in imported:
+                storage.add_blob(db, item["blob"])
+                db.add(item["obj"])
+                if isinstance(item["obj"], models.Video):
+                    db.add(item["index"])
+                else:
+                    index_pgn(db, item["obj"], item["index"])
+    except BaseException:
+        discard_imports(prepared)
+        raise
+    discard_imports(failed)
+
+    return [item["name"] for item in imported], skipped, \
+        [(item["name"], str(item["error"]) or repr(item["error"]))
+         for item in failed]
+
+
+def discard_imports(items):
+    """Remove the files written for imports that weren't
+    committed (see import_files): the index files of their
+    videos, and their blob unless the database references it.
+
+    Args:
+        items (list): imports, dicts with the "blob" and "obj"
+            written for each file.
+    """
+    with models.session_scope() as db:
+        for item in items:
+            # index files are named after the video, keep those
+            # of a video of the same name already in the database
+            if isinstance(item["obj"], models.Video) and \
+                    db.query(models.Video).filter_by(
+                        name=item["obj"].name).first() is None:
+                for suffix in [".npz", ".proxy.avi", ".thumbs.npz"]:
+                    path = os.path.join(models.INDEX_DATA_DIR,
+                                        f"{item['obj'].name}{suffix}")
+                    if os.path.exists(path):
+                        os.remove(path)
+            blob = item["blob"]
+            if blob is not None and os.path.exists(blob["path"]) and \
+                    db.query(models.Blob).get(blob["digest"]) is None:
+                os.remove(blob["path"])
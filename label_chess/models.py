@@ -1,25 +1,62 @@
 #!/usr/bin/env python
 # -*- coding: utf-8 -*-
 
+import contextlib
 import shutil
 import os
 import pathlib
 
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, event, exists, inspect, or_, text
 from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.orm import sessionmaker
+from sqlalchemy.orm import scoped_session, sessionmaker
 from sqlalchemy import Column, Integer, String, \
-    ForeignKey
+    ForeignKey, DateTime
 
 ROOT = pathlib.Path.home()
 DB_DATA_DIR = os.path.join(ROOT, "label_chess_database")
 VIDEO_DATA_DIR = os.path.join(DB_DATA_DIR, "video")
 PGN_DATA_DIR = os.path.join(DB_DATA_DIR, "pgn")
 ANNOTATIONS_DATA_DIR = os.path.join(DB_DATA_DIR, "annotations")
+INDEX_DATA_DIR = os.path.join(DB_DATA_DIR, "index")
+BLOB_DATA_DIR = os.path.join(DB_DATA_DIR, "blobs")
 
 DB_PATH = f"sqlite:///{DB_DATA_DIR}/db.sqlite"
-ENGINE = create_engine(url=DB_PATH)
-SESSION = sessionmaker(bind=ENGINE)
+# time waited for a lock held by another connection
+# (e.g. csv_to_db writing while the app is open), in seconds
+BUSY_TIMEOUT = 30
+# page cache of each connection, in KiB
+CACHE_SIZE = 64 * 1024
+
+
+def tune_sqlite(engine):
+    """Set the pragmas of every new connection of the engine.
+
+    The write-ahead log lets readers and a writer work
+    concurrently instead of locking the whole database, and
+    with it synchronous=NORMAL only syncs at checkpoints,
+    which makes commits much cheaper while staying safe
+    against application crashes.
+
+    Args:
+        engine (sqlalchemy.engine.Engine): sqlite engine
+    """
+    @event.listens_for(engine, "connect")
+    def set_pragmas(connection, _):
+        cursor = connection.cursor()
+        cursor.execute("PRAGMA journal_mode=WAL")
+        cursor.execute("PRAGMA synchronous=NORMAL")
+        cursor.execute(f"PRAGMA cache_size=-{CACHE_SIZE}")
+        cursor.execute("PRAGMA temp_store=MEMORY")
+        cursor.close()
+
+
+ENGINE = create_engine(url=DB_PATH,
+                       connect_args={"timeout": BUSY_TIMEOUT})
+tune_sqlite(ENGINE)
+# objects stay usable once their session is committed and closed
+SESSION = sessionmaker(bind=ENGINE, expire_on_commit=False)
+# one session per thread, for long lived worker threads
+SCOPED_SESSION = scoped_session(SESSION)
 BASE = declarative_base(bind=ENGINE)
 
 # create one directory per type in the database
@@ -41,17 +78,179 @@ def init_db(clear=False):
     os.makedirs(VIDEO_DATA_DIR, exist_ok=True)
     os.makedirs(PGN_DATA_DIR, exist_ok=True)
     os.makedirs(ANNOTATIONS_DATA_DIR, exist_ok=True)
+    os.makedirs(INDEX_DATA_DIR, exist_ok=True)
+    os.makedirs(BLOB_DATA_DIR, exist_ok=True)
 
     BASE.metadata.create_all(checkfirst=True)
+    add_missing_columns()
+    add_missing_indexes()
+
+    # imported here as ingest depends on the models
+    from label_chess import ingest
+    # annotations saved as csv files by older versions
+    with session_scope() as db:
+        ingest.index_legacy_annotations(db)
+
+
+def add_missing_columns():
+    """create_all doesn't alter the tables that already
+    exist. Add the columns of the models that are missing
+    from the tables of an existing database.
+    New columns are nullable and hold NULL for existing rows.
+    ALTER TABLE can't add a UNIQUE column, the uniqueness of
+    those is enforced by a unique index instead.
+    """
+    inspector = inspect(ENGINE)
+    with ENGINE.begin() as connection:
+        for table in BASE.metadata.sorted_tables:
+            columns = {column["name"]
+                       for column in inspector.get_columns(table.name)}
+            for column in table.columns:
+                if column.name in columns:
+                    continue
+                column_type = column.type.compile(dialect=ENGINE.dialect)
+                connection.execute(text(
+                    f"ALTER TABLE {table.name} "
+                    f"ADD COLUMN {column.name} {column_type}"))
+                if column.unique:
+                    connection.execute(text(
+                        f"CREATE UNIQUE INDEX uq_{table.name}_{column.name} "
+                        f"ON {table.name} ({column.name})"))
+
+
+def add_missing_indexes():
+    """create_all doesn't add indexes to the tables that
+    already exist. Create the indexes of the models that are
+    missing from an existing database.
+    """
+    for table in BASE.metadata.sorted_tables:
+        for index in table.indexes:
+            index.create(ENGINE, checkfirst=True)
 
 
 def get_db():
     """Get an slalchemy database session.
+    The session must be closed by the caller, session_scope
+    should be preferred.
     """
     db = SESSION()
     return db
 
 
+@contextlib.contextmanager
+def session_scope(session_factory=SESSION):
+    """Context managed database session. The session is
+    committed if the block succeeds, rolled back otherwise,
+    and always closed.
+
+    Args:
+        session_factory (callable, optional): Defaults to SESSION.
+
+    Yields:
+        sqlalchemy.orm.Session
+    """
+    db = session_factory()
+    try:
+        yield db
+        db.commit()
+    except BaseException:
+        db.rollback()
+        raise
+    finally:
+        db.close()
+
+
+def bulk_insert(db, data_type, rows, chunk_size=10000):
+    """Insert rows without creating ORM objects, in chunks
+    of executemany statements. Much faster than db.add for
+    large numbers of rows, but the rows aren't in the session
+    and their generated keys aren't fetched.
+
+    Args:
+        db (sqlalchemy.orm.Session)
+        data_type (models.*): ORM class of the rows
+        rows (iterable): dicts of column values
+        chunk_size (int, optional): Defaults to 10000.
+
+    Returns:
+        int: number of inserted rows
+    """
+    rows = iter(rows)
+    count = 0
+    while True:
+        chunk = [row for _, row in zip(range(chunk_size), rows)]
+        if not chunk:
+            return count
+        db.bulk_insert_mappings(data_type, chunk)
+        count += len(chunk)
+
+
+def bulk_add(db, objects):
+    """Add new ORM objects and get their generated keys with
+    a single flush.
+
+    Args:
+        db (sqlalchemy.orm.Session)
+        objects (list): new ORM objects
+
+    Returns:
+        list: the objects, with their keys set
+    """
+    db.add_all(objects)
+    db.flush()
+    return objects
+
+
+def file_exists(db, data_type, url, name):
+    """Check if a file with this url or name is already in
+    database. Both columns are indexed (primary key and unique),
+    so this is a point lookup.
+
+    Args:
+        db (sqlalchemy.orm.Session)
+        data_type (Video or PGN)
+        url (str)
+        name (str)
+
+    Returns:
+        bool
+    """
+    query = exists().where(
+        or_(data_type.url == url, data_type.name == name))
+    return db.query(query).scalar()
+
+
+# sqlite limits the number of parameters of a query to 999
+MAX_QUERY_PARAMS = 900
+
+
+def files_exist(db, data_type, pairs):
+    """Check a batch of (url, name) pairs against the database
+    in as few queries as possible.
+
+    Args:
+        db (sqlalchemy.orm.Session)
+        data_type (Video or PGN)
+        pairs (list): (url, name) tuples
+
+    Returns:
+        list: one bool per pair, True if a file with this url
+            or name is already in database.
+    """
+    pairs = list(pairs)
+    urls, names = set(), set()
+    chunk_size = MAX_QUERY_PARAMS // 2
+    for i in range(0, len(pairs), chunk_size):
+        chunk_urls = [url for url, _ in pairs[i: i + chunk_size]]
+        chunk_names = [name for _, name in pairs[i: i + chunk_size]]
+        rows = db.query(data_type.url, data_type.name).filter(
+            or_(data_type.url.in_(chunk_urls),
+                data_type.name.in_(chunk_names))).all()
+        urls.update(url for url, _ in rows)
+        names.update(name for _, name in rows)
+    return [url in urls or name in names for url, name in pairs]
+
+
 def todict(obj):
     """ Return the object's dict excluding private attributes,
     sqlalchemy state and relationship attributes.
@@ -70,6 +269,16 @@ class Repr_MIXIN():
         return f"{self.__class__.__name__}({params})"
 
 
+class Blob(BASE, Repr_MIXIN):
+    __tablename__ = "blob"
+    # sha256 digest of the file content
+    digest = Column(String, primary_key=True)
+    # path to the file in the storage
+    path = Column(String)
+    # size of the file in bytes
+    size = Column(Integer)
+
+
 class Video(BASE, Repr_MIXIN):
     __tablename__ = "video"
     # video url used as primary key as it should
@@ -81,6 +290,27 @@ class Video(BASE, Repr_MIXIN):
     path = Column(String)
     # title of the video
     name = Column(String, unique=True)
+    # stored file, shared by the videos with the same content
+    digest = Column(String, ForeignKey('blob.digest'), index=True)
+
+
+class VideoIndex(BASE, Repr_MIXIN):
+    __tablename__ = "video_index"
+    # indexed video
+    video_url = Column(String, ForeignKey('video.url'), primary_key=True)
+    # path to the npz file containing the keyframe
+    # positions and the frame timestamps
+    path = Column(String)
+    # number of frames in the video
+    nb_frames = Column(Integer)
+    # number of keyframes in the video
+    nb_keyframes = Column(Integer)
+    # path to the all-keyframe low resolution copy of the
+    # video navigated by the annotator, None if not built
+    proxy_path = Column(String)
+    # path to the npz file containing the sprite sheet of
+    # thumbnails of the annotator timeline, None if not built
+    thumbnails_path = Column(String)
 
 
 class PGN(BASE, Repr_MIXIN):
@@ -94,6 +324,39 @@ class PGN(BASE, Repr_MIXIN):
     original_path = Column(String)
     # name of the game
     name = Column(String, unique=True)
+    # stored file, shared by the pgn files with the same content
+    digest = Column(String, ForeignKey('blob.digest'), index=True)
+
+
+class PGNGame(BASE, Repr_MIXIN):
+    __tablename__ = "pgn_game"
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    # pgn file containing the game
+    pgn_url = Column(String, ForeignKey('pgn.url'), index=True)
+    # position of the game in the pgn file (starts at 0)
+    number = Column(Integer)
+    # position of the game in the file, used to seek to it
+    offset = Column(Integer)
+    # name displayed in the app, the pgn file name when the file
+    # contains a single game
+    name = Column(String, unique=True)
+    # headers of the game
+    event = Column(String)
+    white = Column(String)
+    black = Column(String)
+    round = Column(String)
+    date = Column(String)
+    result = Column(String)
+
+
+class Position(BASE, Repr_MIXIN):
+    __tablename__ = "position"
+    # game the position belongs to
+    game_id = Column(Integer, ForeignKey('pgn_game.id'), primary_key=True)
+    # number of half moves played before the position
+    ply = Column(Integer, primary_key=True)
+    # board fen of the position
+    fen = Column(String)
 
 
 class Annotation(BASE, Repr_MIXIN):
@@ -102,8 +365,54 @@ class Annotation(BASE, Repr_MIXIN):
     # be unique
     id = Column(Integer, primary_key=True, autoincrement=True)
     # corresponding video
-    video_url = Column(String, ForeignKey('video.url'))
+    video_url = Column(String, ForeignKey('video.url'), index=True)
     # corresponding pgn
-    pgn_url = Column(String, ForeignKey('pgn.url'))
-    # path to csv file containing moves
+    pgn_url = Column(String, ForeignKey('pgn.url'), index=True)
+    # corresponding game in the pgn file
+    pgn_game_id = Column(Integer, ForeignKey('pgn_game.id'))
+    # path to csv file containing moves, only set for
+    # annotations saved before frames were stored in database
     csv_path = Column(String, unique=True)
+    # name given by the user
+    name = Column(String, unique=True)
+
+
+class AnnotationFrame(BASE, Repr_MIXIN):
+    __tablename__ = "annotation_frame"
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    # annotation the frame was saved in
+    annotation_id = Column(Integer, ForeignKey('annotation.id'), index=True)
+    # position of the frame in the video
+    frame_id = Column(Integer)
+    # position on the board
+    fen = Column(String, index=True)
+    # bounding box of the board in the frame
+    top_left_x = Column(Integer)
+    top_left_y = Column(Integer)
+    bottom_right_x = Column(Integer)
+    bottom_right_y = Column(Integer)
+
+
+class IngestJob(BASE, Repr_MIXIN):
+    __tablename__ = "ingest_job"
+    # hash of the video and pgn urls of the game
+    key = Column(String, primary_key=True)
+    video_url = Column(String)
+    pgn_url = Column(String)
+    # name of the game, used to name its video and pgn files
+    game_id = Column(String, unique=True)
+    # last stage run: "video", "pgn" or "database"
+    stage = Column(String)
+    # "pending", "running", "failed", "done" or "skipped"
+    status = Column(String, index=True)
+    # number of attempts of the stages of the job
+    attempts = Column(Integer, default=0)
+    # error of the last failed attempt
+    error = Column(String)
+    # paths of the downloaded files, set when the
+    # corresponding stage succeeds
+    video_path = Column(String)
+    pgn_path = Column(String)
+    # start of the first attempt and end of the job
+    started_at = Column(DateTime)
+    finished_at = Column(DateTime)
@@ -1,32 +1,331 @@
 #!/usr/bin/env python
 # -*- coding: utf-8 -*-
 
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+import threading
+
 from chess import pgn as c_pgn
 from fen2pil import draw
+import numpy as np
+from PIL import Image
+
+
+# colors and pieces used to render the boards
+DEFAULT_THEME = {
+    "light_color": (255, 253, 208),
+    "dark_color": (76, 153, 0),
+    "pieces_path": draw.PIECES_DIR
+}
+
+# pieces names, the position in the list is the code
+# used for the piece in board arrays, 0 is an empty square
+PIECES = ["", "B", "K", "N", "P", "Q", "R", "b", "k", "n", "p", "q", "r"]
+PIECE_CODES = {piece: code for code, piece in enumerate(PIECES) if piece}
+
+
+def fen_to_codes(fen, nb_squares=8):
+    """Transform a FEN representation to a 2d array of
+    piece codes (see PIECES), first row is the 8th rank.
+
+    Args:
+        fen (str): fen, or board fen, of a position
+
+    Returns:
+        np.ndarray: nb_squares x nb_squares uint8 array
+    """
+    codes = np.zeros((nb_squares, nb_squares), dtype=np.uint8)
+    board_fen = fen.split(" ")[0]
+    for i, rank in enumerate(board_fen.split("/")):
+        j = 0
+        for char in rank:
+            if char.isdigit():
+                j += int(char)
+            else:
+                codes[i, j] = PIECE_CODES[char]
+                j += 1
+    return codes
+
+
+def index_pgn_games(pgn_path, with_fens=False):
+    """Scan a pgn file containing one or more games
+    and yield the position of each game in the file along
+    with its main headers.
+
+    Args:
+        pgn_path (str): path to pgn file
+        with_fens (bool, optional): if True, the moves of the
+            games are replayed and the fens of their positions are
+            returned too. Otherwise, moves aren't parsed.
+            Defaults to False.
+
+    Yields:
+        dict: offset of the game in the file (to pass to
+            pgn_to_fens) and headers: event, white, black,
+            round, date and result. If with_fens, fens of
+            the positions of the game.
+    """
+    with open(pgn_path, "r") as pgn_file:
+        while True:
+            offset = pgn_file.tell()
+            if with_fens:
+                game = c_pgn.read_game(pgn_file)
+                headers = game.headers if game is not None else None
+            else:
+                headers = c_pgn.read_headers(pgn_file)
+            if headers is None:
+                break
+            entry = {
+                "offset": offset,
+                "event": headers.get("Event"),
+                "white": headers.get("White"),
+                "black": headers.get("Black"),
+                "round": headers.get("Round"),
+                "date": headers.get("Date"),
+                "result": headers.get("Result")
+            }
+            if with_fens:
+                entry["fens"] = game_to_fens(game)
+            yield entry
+
+
+def game_to_fens(game):
+    """Get sequence of board's fen representations
+    of the mainline of a game.
+
+    Args:
+        game (chess.pgn.Game)
+
+    Returns:
+        list: list of fen representations, one per move.
+    """
+    board = game.board()
+    fens = [board.board_fen()]
+    for move in game.mainline_moves():
+        board.push(move)
+        fens.append(board.board_fen())
+    return fens
 
 
-def pgn_to_fens(pgn_path):
+def pgn_to_fens(pgn_path, offset=0):
     """Get sequence of board's fen representations
     from a pgn file.
 
     Args:
         pgn_path (str): path to pgn file
+        offset (int, optional): position of the game in the
+            file, as given by index_pgn_games. Defaults to 0
+            (first game).
 
     Returns:
         list: list of fen representations, one per move.
     """
-    fens = []
     with open(pgn_path, "r") as pgn_file:
+        pgn_file.seek(offset)
         game = c_pgn.read_game(pgn_file)
-        board = game.board()
-        fens.append(board.board_fen())
-        for move in game.mainline_moves():
-            board.push(move)
-            fens.append(board.board_fen())
-    return fens
+    return game_to_fens(game)
 
 
-def get_game_board_images(pgn_path, board_size=480):
+class BoardRenderer():
+    """Render board images by compositing pre-rasterized
+    squares with numpy.
+
+    The 12 pieces are drawn once on a light and a dark square
+    for a given board size. A position is then rendered by
+    copying these squares into a preallocated board buffer.
+    Only the squares that differ from the previously rendered
+    position are copied. Output is identical to
+    fen2pil.draw.transform_fen_pil.
+    """
+
+    def __init__(self, board_size=480, theme=DEFAULT_THEME, nb_squares=8):
+        """
+        Args:
+            board_size (int, optional): width of the board images
+                in pixels. Must be divisible by nb_squares.
+                Defaults to 480.
+            theme (dict, optional): rendering options passed to
+                fen2pil. Defaults to DEFAULT_THEME.
+            nb_squares (int, optional): nb of squares per side.
+                Defaults to 8.
+        """
+        self.board_size = board_size
+        self.nb_squares = nb_squares
+        self.lock = threading.Lock()
+
+        empty_board = draw.create_empty_board(
+            board_size=board_size,
+            nb_squares=nb_squares,
+            light_color=theme["light_color"],
+            dark_color=theme["dark_color"]
+        )
+        pieces = draw.load_pieces_images(
+            theme["pieces_path"], nb_squares=nb_squares,
+            board_size=board_size)
+        square_size = board_size // nb_squares
+
+        # squares[code, is_dark] is the image of the piece drawn
+        # on a light or a dark square
+        self.squares = np.zeros(
+            (len(PIECES), 2, square_size, square_size, 3), dtype=np.uint8)
+        for is_dark, color in enumerate(
+                [theme["light_color"], theme["dark_color"]]):
+            for code, piece in enumerate(PIECES):
+                square = Image.new("RGB", (square_size, square_size), color)
+                if piece:
+                    square.paste(pieces[piece], box=(0, 0),
+                                 mask=pieces[piece])
+                self.squares[code, is_dark] = np.asarray(square)
+        self.is_dark = draw.get_chessboard_pattern(nb_squares)
+
+        self.buffer = np.array(empty_board)
+        # view of the buffer indexed by square:
+        # (row, column, square height, square width, channel)
+        self.buffer_squares = self.buffer.reshape(
+            nb_squares, square_size, nb_squares, square_size, 3
+        ).transpose(0, 2, 1, 3, 4)
+        # codes of the position currently in the buffer
+        self.codes = np.zeros((nb_squares, nb_squares), dtype=np.uint8)
+
+    def render(self, fen):
+        """Render the image of a board.
+
+        Args:
+            fen (str)
+
+        Returns:
+            PIL.Image
+        """
+        codes = fen_to_codes(fen, self.nb_squares)
+        with self.lock:
+            rows, columns = np.nonzero(codes != self.codes)
+            self.buffer_squares[rows, columns] = self.squares[
+                codes[rows, columns], self.is_dark[rows, columns]]
+            self.codes = codes
+            return Image.fromarray(self.buffer.copy())
+
+
+class BoardImages():
+    """Sequence of [fen, PIL.Image] pairs for the positions
+    of a game. Boards are rendered on first access and the
+    next positions are rendered in advance on a background
+    thread. Only the most recently used images are kept
+    in memory.
+    """
+
+    def __init__(self, fens, board_size=480, window=16, prefetch=4,
+                 theme=DEFAULT_THEME):
+        """
+        Args:
+            fens (list): fens of the positions of the game
+            board_size (int, optional): width of the board images
+                in pixels. Defaults to 480.
+            window (int, optional): maximum number of images kept
+                in memory. Defaults to 16.
+            prefetch (int, optional): number of positions rendered
+                in advance after an accessed position. Defaults to 4.
+            theme (dict, optional): rendering options passed to
+                fen2pil. Defaults to DEFAULT_THEME.
+        """
+        self.fens = fens
+        self.board_size = board_size
+        self.renderer = BoardRenderer(board_size, theme)
+        self.window = max(window, prefetch + 1)
+        self.prefetch = prefetch
+
+        self.images = OrderedDict()
+        self.pending = {}
+        self.lock = threading.Lock()
+        self.executor = ThreadPoolExecutor(max_workers=1)
+
+    def __len__(self):
+        return len(self.fens)
+
+    def __getitem__(self, index):
+        """Get the fen and the image of a position.
+
+        Args:
+            index (int): position index
+
+        Returns:
+            list: [fen, PIL.Image]
+        """
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError("position index out of range")
+
+        image = self.get_image(index)
+        self.prefetch_images(index + 1)
+        return [self.fens[index], image]
+
+    def get_fen(self, index):
+        """Get the fen of a position without rendering it.
+        """
+        return self.fens[index]
+
+    def render(self, fen):
+        """Render the image of a board.
+
+        Args:
+            fen (str)
+
+        Returns:
+            PIL.Image
+        """
+        return self.renderer.render(fen)
+
+    def get_image(self, index):
+        """Get the image of a position, rendering it
+        unless it is already in memory or being rendered
+        by the background thread.
+        """
+        with self.lock:
+            if index in self.images:
+                self.images.move_to_end(index)
+                return self.images[index]
+            future = self.pending.get(index)
+
+        if future is not None:
+            return future.result()
+        return self.render_image(index)
+
+    def render_image(self, index):
+        """Render the image of a position and keep it
+        in memory, evicting the least recently used images.
+        """
+        image = self.render(self.fens[index])
+        with self.lock:
+            self.images[index] = image
+            self.pending.pop(index, None)
+            while len(self.images) > self.window:
+                self.images.popitem(last=False)
+        return image
+
+    def prefetch_images(self, start):
+        """Render the images of the positions following
+        start on the background thread.
+        """
+        with self.lock:
+            stop = min(start + self.prefetch, len(self))
+            for index in range(start, stop):
+                if index in self.images or index in self.pending:
+                    continue
+                self.pending[index] = self.executor.submit(
+                    self.render_image, index)
+
+    def close(self):
+        """Cancel the pending renderings and stop the
+        background thread.
+        """
+        with self.lock:
+            for future in self.pending.values():
+                future.cancel()
+            self.pending.clear()
+        self.executor.shutdown(wait=False)
+
+
+def get_game_board_images(pgn_path, board_size=480, offset=0):
     """Get PIL.Image representations of chessgame
     positions from a pgn file.
 
@@ -34,21 +333,16 @@ def get_game_board_images(pgn_path, board_size=480):
         pgn_path (str): path to pgn file representation of
             a chess game.
         board_size (int): width of the board image in pixels
+        offset (int, optional): position of the game in the
+            pgn file. Defaults to 0 (first game).
 
     Returns:
-        list: list of PIL.Image representing the positions of the
-            chessgame ordered chronologically.
-        list: list of fens (strings)
+        BoardImages: sequence of [fen, PIL.Image] representing the
+            positions of the chessgame ordered chronologically.
+            Images are rendered when accessed.
     """
-    fens = pgn_to_fens(pgn_path)
-    images = []
-    for fen in fens:
-        img = draw.transform_fen_pil(
-            fen=fen,
-            board_size=board_size
-        )
-        images.append([fen, img])
-    return images
+    fens = pgn_to_fens(pgn_path, offset)
+    return BoardImages(fens, board_size=board_size)
 
 
 # if __name__ == "__main__":
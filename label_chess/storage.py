@@ -0,0 +1,226 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import hashlib
+import os
+import threading
+
+try:
+    import fcntl
+except ImportError:  # not available on Windows
+    fcntl = None
+
+from label_chess import models
+
+# ioctl cloning a file on copy-on-write file systems (btrfs, xfs)
+FICLONE = 0x40049409
+# size of the chunks read, or copied, between two progress reports
+CHUNK_SIZE = 8 * 1024 ** 2
+
+
+class Cancelled(Exception):
+    """Raised by a progress callback to stop storing a file."""
+
+
+def report(progress, stage, done, total):
+    if progress is not None:
+        progress(stage, done, total)
+
+
+def hash_file(path, chunk_size=CHUNK_SIZE, progress=None):
+    """Compute the sha256 digest of a file.
+
+    Args:
+        path (str)
+        chunk_size (int, optional): Defaults to CHUNK_SIZE.
+        progress (callable, optional): called with ("hash", bytes
+            done, total bytes) after each chunk. Defaults to None.
+
+    Returns:
+        str: hexadecimal digest
+    """
+    digest = hashlib.sha256()
+    total = os.path.getsize(path)
+    done = 0
+    with open(path, "rb") as src:
+        for chunk in iter(lambda: src.read(chunk_size), b""):
+            digest.update(chunk)
+            done += len(chunk)
+            report(progress, "hash", done, total)
+    return digest.hexdigest()
+
+
+def reflink(src_path, dst_path):
+    """Clone a file, sharing its blocks until either copy
+    is modified.
+
+    Raises:
+        OSError: if the file system doesn't support it.
+    """
+    if fcntl is None:
+        raise OSError("reflinks are not supported on this platform")
+    with open(src_path, "rb") as src, open(dst_path, "wb") as dst:
+        try:
+            fcntl.ioctl(dst.fileno(), FICLONE, src.fileno())
+        except OSError:
+            dst.close()
+            os.remove(dst_path)
+            raise
+
+
+def copy_range(src_path, dst_path, progress=None):
+    """Copy a file inside the kernel, without going through
+    user space buffers.
+
+    Raises:
+        OSError: if copy_file_range isn't supported.
+    """
+    if not hasattr(os, "copy_file_range"):
+        raise OSError("copy_file_range is not supported on this platform")
+    with open(src_path, "rb") as src, open(dst_path, "wb") as dst:
+        try:
+            total = os.fstat(src.fileno()).st_size
+            done = 0
+            while done < total:
+                copied = os.copy_file_range(
+                    src.fileno(), dst.fileno(), min(CHUNK_SIZE, total - done))
+                if copied == 0:
+                    raise OSError("copy_file_range copied nothing")
+                done += copied
+                report(progress, "copy", done, total)
+        except OSError:
+            dst.close()
+            os.remove(dst_path)
+            raise
+
+
+def copy_bytes(src_path, dst_path, progress=None):
+    """Copy a file by chunks through user space."""
+    total = os.path.getsize(src_path)
+    done = 0
+    with open(src_path, "rb") as src, open(dst_path, "wb") as dst:
+        for chunk in iter(lambda: src.read(CHUNK_SIZE), b""):
+            dst.write(chunk)
+            done += len(chunk)
+            report(progress, "copy", done, total)
+
+
+def cheap_copy(src_path, dst_path, progress=None):
+    """Copy a file with the cheapest method supported: a hard
+    link, a reflink, an in-kernel copy, and a byte copy otherwise.
+    A hard link shares the file with its source: the source
+    must not be modified in place afterwards.
+
+    Args:
+        src_path (str)
+        dst_path (str)
+        progress (callable, optional): called with ("copy", bytes
+            done, total bytes) during the copies that take time.
+            Defaults to None.
+
+    Returns:
+        str: name of the method used
+    """
+    for method, copy in [("link", os.link), ("reflink", reflink)]:
+        try:
+            copy(src_path, dst_path)
+            return method
+        except OSError:
+            continue
+    try:
+        copy_range(src_path, dst_path, progress)
+        return "copy_file_range"
+    except OSError:
+        pass
+    copy_bytes(src_path, dst_path, progress)
+    return "copy"
+
+
+def blob_path(digest, suffix="", blob_dir=None):
+    """Path of a blob in the storage.
+
+    Args:
+        digest (str): sha256 digest of the file
+        suffix (str, optional): file extension. Defaults to "".
+        blob_dir (str, optional): Defaults to models.BLOB_DATA_DIR.
+    """
+    blob_dir = blob_dir or models.BLOB_DATA_DIR
+    return os.path.join(blob_dir, digest[:2], f"{digest}{suffix}")
+
+
+def store_file(path, move=False, blob_dir=None, progress=None):
+    """Add a file to the content addressed storage, under
+    its digest. A file already stored isn't copied again.
+
+    Args:
+        path (str): file to store
+        move (bool, optional): move the file to the storage
+            instead of copying it. Defaults to False.
+        blob_dir (str, optional): Defaults to models.BLOB_DATA_DIR.
+        progress (callable, optional): called with (stage, bytes
+            done, total bytes) while the file is hashed ("hash") then
+            copied ("copy"). It can raise Cancelled to stop, the
+            storage is then left unchanged. Defaults to None.
+
+    Returns:
+        dict: digest, path and size of the blob
+    """
+    digest = hash_file(path, progress=progress)
+    suffix = os.path.splitext(path)[1].lower()
+    stored_path = blob_path(digest, suffix, blob_dir)
+    blob = {"digest": digest, "path": stored_path,
+            "size": os.path.getsize(path)}
+
+    if os.path.exists(stored_path):
+        if move:
+            os.remove(path)
+        return blob
+
+    os.makedirs(os.path.dirname(stored_path), exist_ok=True)
+    if move:
+        try:
+            os.replace(path, stored_path)
+            return blob
+        except OSError:
+            # different file systems
+            pass
+
+    # copy to a temporary file so that an interrupted copy
+    # never leaves a partial blob under the digest
+    tmp_path = f"{stored_path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    try:
+        cheap_copy(path, tmp_path, progress)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+    os.replace(tmp_path, stored_path)
+    if move:
+        os.remove(path)
+    return blob
+
+
+def stored_blob(stored_path):
+    """Get the description of a file of the storage
+    from its path.
+
+    Returns:
+        dict: digest, path and size of the blob (see store_file)
+    """
+    digest = os.path.splitext(os.path.basename(stored_path))[0]
+    return {"digest": digest, "path": stored_path,
+            "size": os.path.getsize(stored_path)}
+
+
+def add_blob(db, blob):
+    """Add a blob to the session, unless it is already in
+    the database.
+
+    Args:
+        db (sqlalchemy.orm.Session)
+        blob (dict): see store_file
+
+    Returns:
+        models.Blob
+    """
+    return db.merge(models.Blob(**blob))
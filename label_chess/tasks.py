@@ -0,0 +1,70 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import threading
+import traceback
+
+from label_chess import storage
+
+
+class BackgroundTask():
+    def __init__(self, name, target, obj=None):
+        """Run a job of the app (import, export, video scan)
+        on a worker thread. The progress reported by the job is
+        kept to be read from the Tk thread, which must not be
+        called from the worker.
+
+        Args:
+            name (str): name of the job
+            target (callable): function running the job, called
+                with a progress callback (see storage.store_file).
+                Its result is kept in self.result.
+            obj (models.*, optional): ORM object the job works on,
+                e.g. the file added by an import. Defaults to None.
+        """
+        self.name = name
+        self.target = target
+        self.obj = obj
+        self.result = None
+        self.stage, self.progress_done, self.progress_total = \
+            "pending", 0, 0
+        self.cancel_event = threading.Event()
+        self.cancelled = False
+        self.error = None
+        self.done = False
+        self.thread = threading.Thread(target=self.run, daemon=True)
+
+    def start(self):
+        self.thread.start()
+
+    def cancel(self):
+        """Ask the job to stop at its next progress report.
+        """
+        self.cancel_event.set()
+
+    def report(self, stage, done, total):
+        if self.cancel_event.is_set():
+            raise storage.Cancelled
+        self.stage, self.progress_done, self.progress_total = \
+            stage, done, total
+
+    def run(self):
+        try:
+            self.result = self.target(self.report)
+        except storage.Cancelled:
+            self.cancelled = True
+        except Exception as e:
+            traceback.print_exc()
+            self.error = e
+        finally:
+            self.done = True
+
+    def describe(self):
+        """Progress of the job as text.
+        """
+        stage, done, total = \
+            self.stage, self.progress_done, self.progress_total
+        text = f"{self.name}: {stage}"
+        if total > 0:
+            text += f" {100 * done // total}%"
+        return text
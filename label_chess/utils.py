@@ -1,67 +1,733 @@
 #!/usr/bin/env python
 # -*- coding: utf-8 -*-
 
+from collections import OrderedDict, deque
+from concurrent.futures import ProcessPoolExecutor
+import os
+import queue
+import threading
+
 import cv2
+import numpy as np
+
+
+# number of kept frames of the segments decoded in parallel
+# by frames_from_video_generator
+SEGMENT_FRAMES = 32
 
 
-def frames_from_video_generator(video_path, fps_ratio):
+def frames_from_video_generator(video_path, fps_ratio, workers=1,
+                                segment_size=None, keyframes=None):
     """Load frames from a video in memory.
 
+    Only the kept frames are retrieved and converted. Without
+    the keyframes, every frame is grabbed. With them, the video
+    seeks over the whole groups of pictures between two kept
+    frames when fps_ratio exceeds the keyframe spacing (see
+    plan_seek).
+
+    With several workers, the video is split into segments that
+    are decoded by separate processes, each with its own capture.
+    Frames are still yielded in order. At most 2 segments per
+    worker are decoded ahead of the consumer, so that memory
+    doesn't grow with the length of the video.
+
     Args:
         video_path (str): path to video
         fps_ratio (int): only 1/fps_ratio frames are kept
-        new_fps (int): desired fps for the frames. Only one frame
-            in every old_fps/new_fps is kept.
+        workers (int, optional): number of processes. Defaults to 1
+            (frames are decoded in the calling process).
+        segment_size (int, optional): number of frames of a segment,
+            rounded to a multiple of fps_ratio. Defaults to None
+            (SEGMENT_FRAMES kept frames).
+        keyframes (np.ndarray, optional): sorted positions of the
+            keyframes of the video (see build_video_index). Defaults
+            to None.
 
-    Returns:
-        list: list of frames
-        int: frame number
+    Yields:
+        list: [frame, frame number]
+    """
+    print("Loading frames.")
+    if workers <= 1:
+        yield from iter_video_segment(
+            video_path, fps_ratio, keyframes=keyframes)
+        return
+
+    video = cv2.VideoCapture(video_path)
+    nb_frames = int(video.get(cv2.CAP_PROP_FRAME_COUNT))
+    video.release()
+    if segment_size is None:
+        segment_size = SEGMENT_FRAMES * fps_ratio
+    # segments start on kept frames
+    segment_size = max(-(-segment_size // fps_ratio), 1) * fps_ratio
+
+    starts = iter(range(0, nb_frames, segment_size))
+    with ProcessPoolExecutor(workers) as pool:
+        # segments being decoded, in order
+        pending = deque()
+
+        def submit():
+            start = next(starts, None)
+            if start is not None:
+                pending.append(pool.submit(
+                    decode_video_segment, video_path, fps_ratio,
+                    start, start + segment_size, keyframes))
+
+        for _ in range(2 * workers):
+            submit()
+        try:
+            while pending:
+                segment = pending.popleft().result()
+                # decode the next segment while this one is consumed
+                submit()
+                yield from segment
+        finally:
+            # the consumer stopped early
+            for future in pending:
+                future.cancel()
+
+
+def iter_video_segment(video_path, fps_ratio, start=0, stop=None,
+                       keyframes=None):
+    """Decode one in fps_ratio frames of a range of a video.
+
+    Args:
+        video_path (str): path to video
+        fps_ratio (int): only 1/fps_ratio frames are kept
+        start (int, optional): position of the first frame.
+            Defaults to 0.
+        stop (int, optional): position after the last frame.
+            Defaults to None (end of the video).
+        keyframes (np.ndarray, optional): sorted positions of the
+            keyframes of the video. Defaults to None (every frame
+            is grabbed).
+
+    Yields:
+        list: [frame, frame number] of the kept frames
     """
-    frame_number = 0
+    frame_number = start
 
     cap = cv2.VideoCapture(video_path)
-    print("Loading frames.")
-    while True:
-        ret, frame = cap.read()
-        if ret:
-            if frame_number % fps_ratio == 0:
-                frame = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
-                yield [frame, frame_number]
-            frame_number += 1
-        else:
+    if keyframes is not None and len(keyframes) > 0:
+        nb_frames = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+        if stop is not None:
+            nb_frames = min(nb_frames, stop)
+        # kept frames of the range
+        frame_ids = range(-(-start // fps_ratio) * fps_ratio,
+                          nb_frames, fps_ratio)
+        for frame_id, frame in zip(
+                frame_ids, get_video_frames(cap, frame_ids, keyframes)):
+            if frame is None:
+                break
+            yield [frame, frame_id]
+        cap.release()
+        return
+
+    if start > 0:
+        cap.set(cv2.CAP_PROP_POS_FRAMES, start)
+    while stop is None or frame_number < stop:
+        if not cap.grab():
             break
+        if frame_number % fps_ratio == 0:
+            ret, frame = cap.retrieve()
+            if not ret:
+                break
+            frame = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
+            yield [frame, frame_number]
+        frame_number += 1
     cap.release()
 
 
-def frame_id_generator(video, fps_ratio=1):
+def decode_video_segment(video_path, fps_ratio, start=0, stop=None,
+                         keyframes=None):
+    """Worker of the segment parallel mode of
+    frames_from_video_generator.
+
+    Returns:
+        list: [frame, frame number] of the kept frames
+            (see iter_video_segment)
+    """
+    return list(iter_video_segment(
+        video_path, fps_ratio, start, stop, keyframes))
+
+
+def frame_id_generator(video, fps_ratio=1, start=0):
     """ Generator of frame positions with a
-    fixed offset.
+    fixed offset, from position start.
     """
     nb_frames = int(video.get(cv2.CAP_PROP_FRAME_COUNT))
-    for i in range(0, nb_frames, fps_ratio):
+    for i in range(start, nb_frames, fps_ratio):
         yield i
 
 
-def get_video_frame(video, frame_id, last_frame_id=0):
-    """ Get a specific frame from a video
+def get_video_frame(video, frame_id, last_frame_id=0, keyframes=None):
+    """ Get a specific frame from a video (see get_video_frames).
     Args:
         video (cv2.VideoCapture)
         frame_id (int): frame position
         last_frame_id (int): last frame position pass to the function.
-            setting the position is expensive. this gives the possibility
-            to not set the pos.
+            Unused, the position is read from the video.
+        keyframes (np.ndarray, optional): sorted positions of the
+            keyframes of the video (see build_video_index). Defaults
+            to None.
     """
-    if frame_id - last_frame_id != 1:
-        video.set(cv2.CAP_PROP_POS_FRAMES, frame_id)
+    return next(get_video_frames(video, [frame_id], keyframes))
+
+
+class FrameCache():
+    """LRU cache of decoded video frames keyed by frame
+    number. The cache is bounded by the total size in
+    bytes of the frames it holds: once the budget is
+    exceeded, the least recently used frames are evicted.
+    """
+
+    def __init__(self, max_bytes=512 * 1024 ** 2):
+        """
+        Args:
+            max_bytes (int, optional): memory budget of the
+                cache in bytes. Defaults to 512MiB.
+        """
+        self.max_bytes = max_bytes
+        self.nbytes = 0
+        self.frames = OrderedDict()
 
-    ret, frame = video.read()
+    def __contains__(self, frame_id):
+        return frame_id in self.frames
 
-    if ret:
-        frame = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
+    def __len__(self):
+        return len(self.frames)
+
+    def get(self, frame_id):
+        """Get a frame from the cache and mark it
+        as the most recently used.
+
+        Args:
+            frame_id (int): frame position
+
+        Returns:
+            np.ndarray: frame, None if not cached
+        """
+        frame = self.frames.get(frame_id)
+        if frame is not None:
+            self.frames.move_to_end(frame_id)
         return frame
+
+    def put(self, frame_id, frame):
+        """Add a frame to the cache then evict the least
+        recently used frames until the cache fits in its
+        budget. A frame bigger than the budget is not cached.
+
+        Args:
+            frame_id (int): frame position
+            frame (np.ndarray): decoded frame
+        """
+        if frame is None or frame.nbytes > self.max_bytes:
+            return
+        if frame_id in self.frames:
+            self.nbytes -= self.frames.pop(frame_id).nbytes
+        self.frames[frame_id] = frame
+        self.nbytes += frame.nbytes
+
+        while self.nbytes > self.max_bytes:
+            _, evicted = self.frames.popitem(last=False)
+            self.nbytes -= evicted.nbytes
+
+    def clear(self):
+        self.frames.clear()
+        self.nbytes = 0
+
+
+class FramePrefetcher():
+    """Decode the frames of a video ahead of time on a
+    background thread. The worker owns its own
+    cv2.VideoCapture, walks the video with a fixed
+    offset (see frame_id_generator) and pushes the
+    decoded frames to a bounded queue.
+    """
+
+    def __init__(self, video_path, fps_ratio=1, depth=16, keyframes=None,
+                 start=0):
+        """Start the worker.
+
+        Args:
+            video_path (str): path to video
+            fps_ratio (int, optional): only 1/fps_ratio frames are
+                decoded. Defaults to 1.
+            depth (int, optional): maximum number of decoded frames
+                waiting in the queue. Defaults to 16.
+            keyframes (np.ndarray, optional): positions of the keyframes
+                of the video, used to seek faster. Defaults to None.
+            start (int, optional): position of the first decoded
+                frame. Defaults to 0.
+        """
+        self.video_path = video_path
+        self.fps_ratio = fps_ratio
+        self.start = start
+        self.keyframes = keyframes
+        self.queue = queue.Queue(maxsize=depth)
+        self.stop_event = threading.Event()
+        self.exhausted = False
+
+        self.thread = threading.Thread(target=self.run, daemon=True)
+        self.thread.start()
+
+    def run(self):
+        """Worker loop. A None item is pushed to the queue
+        once the video has been read entirely.
+        """
+        video = load_video(self.video_path)
+        try:
+            frame_ids = list(frame_id_generator(
+                video, self.fps_ratio, self.start))
+            frames = get_video_frames(video, frame_ids, self.keyframes)
+            for frame_id, frame in zip(frame_ids, frames):
+                if frame is None or not self.put((frame_id, frame)):
+                    break
+        finally:
+            video.release()
+            self.put(None)
+
+    def put(self, item):
+        """Push an item to the queue, waiting for a free slot
+        unless the worker is stopped.
+
+        Returns:
+            bool: False if the worker was stopped before the
+                item could be pushed.
+        """
+        while not self.stop_event.is_set():
+            try:
+                self.queue.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def get(self):
+        """Pop the next decoded frame, waiting for the worker
+        if it is not decoded yet.
+
+        Raises:
+            StopIteration: when there is no frame left.
+
+        Returns:
+            int: frame position
+            np.ndarray: RGB frame
+        """
+        if self.exhausted:
+            raise StopIteration
+        item = self.queue.get()
+        if item is None:
+            self.exhausted = True
+            raise StopIteration
+        return item
+
+    def stop(self):
+        """Cancel the worker and wait for it to release
+        the video.
+        """
+        self.stop_event.set()
+        self.thread.join()
+
+
+# cost of setting the position of a video, in number of decoded
+# frames (flushing the decoder and reading from the keyframe
+# are counted separately)
+SEEK_COST = 2
+# when the position is set, opencv restarts decoding from the
+# last keyframe at least SEEK_DELTA frames before the requested
+# frame, then decodes up to it
+SEEK_DELTA = 16
+# keyframe spacing assumed when the keyframes aren't known
+DEFAULT_GOP = 30
+
+
+def plan_seek(position, frame_id, keyframes=None):
+    """Choose how to move a video from position to frame_id:
+    either decode and drop the frames in between with grab(), or
+    set the position, which makes the decoder restart from a
+    keyframe before frame_id (see SEEK_DELTA).
+
+    Args:
+        position (int): position of the next frame of the video
+        frame_id (int): position of the requested frame
+        keyframes (np.ndarray, optional): sorted positions of the
+            keyframes of the video. Defaults to None.
+
+    Returns:
+        int: position to set, None if frames should be grabbed
+            from the current position.
+    """
+    distance = frame_id - position
+    if keyframes is None or len(keyframes) == 0:
+        if distance < 0 or \
+                distance > SEEK_COST + SEEK_DELTA + DEFAULT_GOP // 2:
+            return frame_id
+        return None
+
+    # keyframe the decoder restarts from after a seek
+    keyframe = int(keyframes[max(np.searchsorted(
+        keyframes, frame_id - SEEK_DELTA, side="right") - 1, 0)])
+    if distance < 0 or SEEK_COST + frame_id - keyframe < distance:
+        return frame_id
+    return None
+
+
+def get_video_frames(video, frame_ids, keyframes=None):
+    """Get several frames from a video.
+
+    The requested frames are decoded once each, in increasing
+    order, moving between them with seeks or grab() depending on
+    their distance and the keyframe spacing (see plan_seek). Only
+    the requested frames are retrieved and converted.
+
+    Args:
+        video (cv2.VideoCapture)
+        frame_ids (list): frame positions, in any order, possibly
+            repeated.
+        keyframes (np.ndarray, optional): sorted positions of the
+            keyframes of the video. Defaults to None.
+
+    Yields:
+        np.ndarray: RGB frames in the order of frame_ids, None
+            for the frames that can't be read.
+    """
+    frame_ids = list(frame_ids)
+    # number of times each frame is still to be yielded
+    remaining = {}
+    for frame_id in frame_ids:
+        remaining[frame_id] = remaining.get(frame_id, 0) + 1
+
+    decoded = {}
+    targets = iter(sorted(remaining))
+    position = int(video.get(cv2.CAP_PROP_POS_FRAMES))
+    for frame_id in frame_ids:
+        # decode the following requested frames until this one is
+        # available, keeping the ones requested later
+        while frame_id not in decoded:
+            target = next(targets)
+            seek = plan_seek(position, target, keyframes)
+            if seek is not None:
+                video.set(cv2.CAP_PROP_POS_FRAMES, seek)
+                position = seek
+            ret = True
+            while ret and position <= target:
+                ret = video.grab()
+                position += 1
+            frame = None
+            if ret:
+                ret, frame = video.retrieve()
+            if ret:
+                frame = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
+            decoded[target] = frame if ret else None
+
+        remaining[frame_id] -= 1
+        if remaining[frame_id] == 0:
+            yield decoded.pop(frame_id)
+        else:
+            yield decoded[frame_id]
+
+
+# mean absolute difference of the gray levels of a square of two
+# boards above which the board is considered changed
+CHANGE_THRESHOLD = 8
+# size the board areas are resized to before comparing them,
+# a multiple of 8 so that each square has the same number of pixels
+CHANGE_SIZE = 64
+
+
+def board_area(frame, box, size=CHANGE_SIZE, code=cv2.COLOR_BGR2GRAY):
+    """Crop a frame to a box, convert it to gray levels and
+    resize it to a small square, so that comparing two boards is
+    cheap and insensitive to the compression noise.
+
+    Args:
+        frame (np.ndarray): H x W x 3 image
+        box (tuple): x0, y0, x1, y1 pixel coordinates of the area
+        size (int, optional): Defaults to CHANGE_SIZE.
+        code (int, optional): color conversion of the frame.
+            Defaults to cv2.COLOR_BGR2GRAY.
+
+    Returns:
+        np.ndarray: size x size int16 gray levels of the area
+    """
+    x0, y0, x1, y1 = box
+    area = cv2.cvtColor(np.ascontiguousarray(frame[y0:y1, x0:x1]), code)
+    area = cv2.resize(area, (size, size), interpolation=cv2.INTER_AREA)
+    return area.astype(np.int16)
+
+
+def square_differences(area, reference):
+    """Mean absolute difference of two board areas (see
+    board_area) on each square of an 8 x 8 grid. A move only
+    changes a few squares: averaging over the whole board would
+    hide it.
+
+    Returns:
+        np.ndarray: 8 x 8 differences, first row is the top
+            of the areas.
+    """
+    size = area.shape[0]
+    differences = np.abs(area - reference)
+    return differences.reshape(8, size // 8, 8, size // 8).mean(axis=(1, 3))
+
+
+def find_next_change(video_path, start, reference, box, fps_ratio=1,
+                     threshold=CHANGE_THRESHOLD, keyframes=None,
+                     progress=None):
+    """Find the next frame whose board differs from a reference
+    frame. The video is read forward from start: only the frames
+    sampled every fps_ratio frames are retrieved, the others are
+    skipped with grab() or a seek (see plan_seek).
+
+    Args:
+        video_path (str): path to video
+        start (int): position of the reference frame
+        reference (np.ndarray): RGB reference frame
+        box (tuple): x0, y0, x1, y1 pixel coordinates of the board
+        fps_ratio (int, optional): only 1/fps_ratio frames are
+            compared. Defaults to 1.
+        threshold (float, optional): mean absolute difference of
+            the gray levels of a square above which the board
+            changed (see square_differences). Defaults to
+            CHANGE_THRESHOLD.
+        keyframes (np.ndarray, optional): keyframe positions of the
+            video. Defaults to None.
+        progress (callable, optional): called with ("change", frames
+            done, total) after each compared frame. Defaults to None.
+
+    Returns:
+        int: position of the first changed frame, None if the
+            board doesn't change until the end of the video.
+    """
+    reference = board_area(reference, box, code=cv2.COLOR_RGB2GRAY)
+    video = load_video(video_path)
+    nb_frames = int(video.get(cv2.CAP_PROP_FRAME_COUNT))
+    position = 0
+    try:
+        for target in range(start + fps_ratio, nb_frames, fps_ratio):
+            seek = plan_seek(position, target, keyframes)
+            if seek is not None:
+                video.set(cv2.CAP_PROP_POS_FRAMES, seek)
+                position = seek
+            # frames in between are decoded but neither retrieved
+            # nor converted
+            while position <= target:
+                if not video.grab():
+                    return None
+                position += 1
+            ret, frame = video.retrieve()
+            if not ret:
+                return None
+
+            area = board_area(frame, box)
+            if square_differences(area, reference).max() > threshold:
+                return target
+            if progress is not None:
+                progress("change", target - start, nb_frames - start)
+    finally:
+        video.release()
     return None
 
 
+def build_video_index(video_path):
+    """Read a video once and record the position of its
+    keyframes and the timestamp of each frame.
+
+    Packets are read without being decoded when the opencv
+    build supports it. Otherwise the keyframes can't be known
+    and an empty array is returned for them.
+
+    Args:
+        video_path (str): path to video
+
+    Returns:
+        np.ndarray: positions of the keyframes
+        np.ndarray: timestamp of each frame in ms
+    """
+    video = cv2.VideoCapture(video_path, cv2.CAP_FFMPEG)
+    has_keyframes = hasattr(cv2, "CAP_PROP_LRF_HAS_KEY_FRAME") and \
+        video.set(cv2.CAP_PROP_FORMAT, -1)
+
+    keyframes, timestamps = [], []
+    while video.grab():
+        if has_keyframes and video.get(cv2.CAP_PROP_LRF_HAS_KEY_FRAME):
+            keyframes.append(len(timestamps))
+        timestamps.append(video.get(cv2.CAP_PROP_POS_MSEC))
+    video.release()
+
+    return np.array(keyframes, dtype=np.int64), \
+        np.array(timestamps, dtype=np.float64)
+
+
+def save_video_index(path, keyframes, timestamps):
+    """Save a video index (see build_video_index) to
+    a npz file.
+    """
+    with open(path, "wb") as index_file:
+        np.savez_compressed(index_file, keyframes=keyframes,
+                            timestamps=timestamps)
+
+
+def load_video_index(path):
+    """Load a video index saved with save_video_index.
+
+    Returns:
+        np.ndarray: positions of the keyframes
+        np.ndarray: timestamp of each frame in ms
+    """
+    with np.load(path) as index:
+        return index["keyframes"], index["timestamps"]
+
+
+def build_proxy_video(video_path, proxy_path, height=360, progress=None):
+    """Transcode a video to a downscaled motion jpeg video,
+    in which every frame is a keyframe: setting the position
+    only decodes the requested frame.
+
+    Args:
+        video_path (str): path to video
+        proxy_path (str): path to the proxy, an .avi file
+        height (int, optional): height of the proxy, videos are
+            not upscaled. Defaults to 360.
+        progress (callable, optional): called with ("proxy", frames
+            done, total) after each frame. It can raise an exception
+            to stop, the partial proxy is then removed. Defaults
+            to None.
+
+    Returns:
+        int: number of frames of the proxy
+    """
+    video = cv2.VideoCapture(video_path)
+    fps = video.get(cv2.CAP_PROP_FPS) or 25
+    total = int(video.get(cv2.CAP_PROP_FRAME_COUNT))
+    writer, size = None, None
+    nb_frames = 0
+    try:
+        while True:
+            ret, frame = video.read()
+            if not ret:
+                break
+            if writer is None:
+                frame_height, frame_width = frame.shape[:2]
+                scale = min(height / frame_height, 1)
+                # even dimensions
+                size = (2 * round(frame_width * scale / 2),
+                        2 * round(frame_height * scale / 2))
+                writer = cv2.VideoWriter(
+                    proxy_path, cv2.VideoWriter_fourcc(*"MJPG"), fps, size)
+            if size != (frame.shape[1], frame.shape[0]):
+                frame = cv2.resize(frame, size, interpolation=cv2.INTER_AREA)
+            writer.write(frame)
+            nb_frames += 1
+            if progress is not None:
+                progress("proxy", nb_frames, total)
+    except BaseException:
+        if writer is not None:
+            writer.release()
+            writer = None
+        if os.path.exists(proxy_path):
+            os.remove(proxy_path)
+        raise
+    finally:
+        video.release()
+        if writer is not None:
+            writer.release()
+    return nb_frames
+
+
+def build_thumbnail_sheet(video_path, interval, height=72, columns=32,
+                          keyframes=None, progress=None):
+    """Sample one thumbnail every interval seconds of a video
+    and tile them in a single sprite sheet image, row by row.
+
+    Args:
+        video_path (str): path to video
+        interval (float): number of seconds between two thumbnails
+        height (int, optional): thumbnail height. Defaults to 72.
+        columns (int, optional): number of thumbnails per row of
+            the sheet. Defaults to 32.
+        keyframes (np.ndarray, optional): keyframe positions of the
+            video, used to seek between thumbnails. Defaults to None.
+        progress (callable, optional): called with ("thumbnails",
+            thumbnails done, total) after each thumbnail. Defaults
+            to None.
+
+    Returns:
+        np.ndarray: RGB sheet, None if no frame could be read
+        np.ndarray: frame position of each thumbnail
+        tuple: width and height of a thumbnail
+    """
+    video = load_video(video_path)
+    nb_frames = int(video.get(cv2.CAP_PROP_FRAME_COUNT))
+    fps = video.get(cv2.CAP_PROP_FPS) or 25
+    frame_ids = list(range(0, nb_frames, max(1, round(fps * interval))))
+
+    thumbnails, thumbnail_ids, size = [], [], None
+    try:
+        frames = get_video_frames(video, frame_ids, keyframes)
+        for i, (frame_id, frame) in enumerate(zip(frame_ids, frames)):
+            if frame is not None:
+                if size is None:
+                    frame_height, frame_width = frame.shape[:2]
+                    size = (round(frame_width * height / frame_height),
+                            height)
+                thumbnails.append(cv2.resize(
+                    frame, size, interpolation=cv2.INTER_AREA))
+                thumbnail_ids.append(frame_id)
+            if progress is not None:
+                progress("thumbnails", i + 1, len(frame_ids))
+    finally:
+        video.release()
+
+    if not thumbnails:
+        return None, np.array(thumbnail_ids, dtype=np.int64), size
+
+    width = size[0]
+    rows = -(-len(thumbnails) // columns)
+    sheet = np.zeros((rows * height, min(columns, len(thumbnails)) * width,
+                      3), dtype=np.uint8)
+    for i, thumbnail in enumerate(thumbnails):
+        row, column = divmod(i, columns)
+        sheet[row * height:(row + 1) * height,
+              column * width:(column + 1) * width] = thumbnail
+    return sheet, np.array(thumbnail_ids, dtype=np.int64), size
+
+
+def save_thumbnail_sheet(path, sheet, frame_ids, size, quality=80):
+    """Save a sprite sheet (see build_thumbnail_sheet) to a
+    npz file, the sheet being stored as a jpeg image.
+    """
+    _, jpeg = cv2.imencode(".jpg", cv2.cvtColor(sheet, cv2.COLOR_RGB2BGR),
+                           [cv2.IMWRITE_JPEG_QUALITY, quality])
+    with open(path, "wb") as sheet_file:
+        np.savez(sheet_file, sheet=jpeg, frame_ids=frame_ids,
+                 size=np.array(size, dtype=np.int64))
+
+
+def load_thumbnails(path):
+    """Load the thumbnails of a sprite sheet saved with
+    save_thumbnail_sheet.
+
+    Returns:
+        list: RGB thumbnails, as np.ndarray
+        np.ndarray: frame position of each thumbnail
+    """
+    with np.load(path) as sheet_file:
+        jpeg, frame_ids = sheet_file["sheet"], sheet_file["frame_ids"]
+        width, height = sheet_file["size"]
+    sheet = cv2.cvtColor(cv2.imdecode(jpeg, cv2.IMREAD_COLOR),
+                         cv2.COLOR_BGR2RGB)
+    columns = sheet.shape[1] // width
+
+    thumbnails = []
+    for i in range(len(frame_ids)):
+        row, column = divmod(i, columns)
+        thumbnails.append(sheet[row * height:(row + 1) * height,
+                                column * width:(column + 1) * width])
+    return thumbnails, frame_ids
+
+
 def load_video(video_path):
     video = cv2.VideoCapture(video_path)
     return video
@@ -1,7 +1,8 @@
 #!/usr/bin/env python
 # -*- coding: utf-8 -*-
 
-from PIL import Image, ImageTk, ImageDraw
+from PIL import Image, ImageTk
+import bisect
 
 import tkinter as tk
 
@@ -267,7 +268,7 @@ class PGNFrame(tk.Frame, ButtonsMixin):
 
 class VideoFrame(tk.Frame, ButtonsMixin):
     def __init__(self, master=None, height=0, img_prop=0.8,
-                 max_chars_vid_list=80):
+                 max_chars_vid_list=80, timeline_prop=0.05):
         """Frame to display and navigate frames from a chess game
         video.
         Frame is displayed in the central label.
@@ -280,6 +281,8 @@ class VideoFrame(tk.Frame, ButtonsMixin):
             max_chars_pgn_list (int, optional): only the first max_chars_pgn_list
                 characters of a pgn file name are displayed in the
                 "select_video" option menu. Defaults to 80.
+            timeline_prop (float, optional): the timeline thumbnails
+                height is 5% of the window's height. Defaults to 0.05.
         """
 
         tk.Frame.__init__(self, master)
@@ -289,11 +292,20 @@ class VideoFrame(tk.Frame, ButtonsMixin):
         self.img_prop = img_prop
         self.height = height
         self.max_chars_vid_list = max_chars_vid_list
+        self.timeline_prop = timeline_prop
 
         self.default_video_option = "Select video..."
         self.default_fps_option = "FPS ratio..."
 
+        # bounding box drawn over the video frame
+        self.bbox_color = "red"
+        self.bbox_width = 3
+        # outline of the timeline thumbnail of the current frame
+        self.timeline_color = "red"
+        self.timeline_width = 2
+
         self.labels = {}
+        self.canvases = {}
         self.string_vars = {}
         self.config_window()
 
@@ -303,7 +315,7 @@ class VideoFrame(tk.Frame, ButtonsMixin):
         # Main container
         self.container = tk.LabelFrame(
             master=self, text="Frames", **cfg.LBL_FRM())
-        self.container.rowconfigure([0, 2],  weight=1)
+        self.container.rowconfigure([0, 2, 3],  weight=1)
         self.container.rowconfigure(1,  weight=2)
 
         self.container.columnconfigure(0, weight=1)
@@ -315,6 +327,8 @@ class VideoFrame(tk.Frame, ButtonsMixin):
         self.create_frame_sliders(self.container)
         # navigate frames
         self.create_navigation_buttons(self.container)
+        # jump to a thumbnail of the video
+        self.create_timeline(self.container)
 
     def create_video_selection(self, master):
         """Frame containing buttons to load a video
@@ -373,10 +387,19 @@ class VideoFrame(tk.Frame, ButtonsMixin):
 
         self.frm_img_right_slider.grid(row=1, column=0, sticky="nsew")
 
-        # img
-        self.labels["frame"] = tk.Label(
-            master=self.frm_img_right_slider)
-        self.labels["frame"].grid(row=0, column=1, sticky="nsew")
+        # img, displayed in a canvas so that the bounding box
+        # is drawn over it without redrawing the image
+        self.canvases["frame"] = tk.Canvas(
+            master=self.frm_img_right_slider,
+            bd=0, highlightthickness=0)
+        self.canvases["frame"].grid(row=0, column=1, sticky="nsew")
+        self.canvas_items = {
+            "frame": self.canvases["frame"].create_image(
+                0, 0, anchor="nw"),
+            "bbox": self.canvases["frame"].create_rectangle(
+                0, 0, 0, 0, outline=self.bbox_color,
+                width=self.bbox_width, state="hidden")
+        }
         self.set_image(Image.new('RGB', (1280, 720)))
 
         # side sliders
@@ -441,14 +464,14 @@ class VideoFrame(tk.Frame, ButtonsMixin):
 
     def create_navigation_buttons(self, master):
         """Frame containing buttons to navigate
-        video frames (previous, next) and save/unsave
-        a frame.
+        video frames (previous, next, next board change)
+        and save/unsave a frame.
         """
         # frames navigation buttons
         self.frm_images_buttons = tk.Frame(master=master)
         self.frm_images_buttons.grid(row=2, column=0, sticky="nsew")
         self.frm_images_buttons.rowconfigure(0,  weight=1)
-        self.frm_images_buttons.columnconfigure([0, 1, 2, 3, 4], weight=1)
+        self.frm_images_buttons.columnconfigure([0, 1, 2, 3, 4, 5], weight=1)
 
         # previous frame button
         self.buttons["previous_frame"] = tk.Button(
@@ -478,11 +501,134 @@ class VideoFrame(tk.Frame, ButtonsMixin):
             state="disabled", **cfg.BTN())
         self.buttons["next_frame"].grid(row=0, column=4, sticky="nsew")
 
+        # next board change button
+        self.buttons["next_change"] = tk.Button(
+            master=self.frm_images_buttons,
+            text="Next change(Shift+Right)",
+            state="disabled", **cfg.BTN())
+        self.buttons["next_change"].grid(row=0, column=5, sticky="nsew")
+
         # label to display popup when frame is saves
         self.labels["saved"] = tk.Label(
             master=self.frm_images_buttons)
         self.labels["saved"].grid(row=0, column=2, sticky="nsew")
 
+    def create_timeline(self, master):
+        """Frame containing a horizontally scrolled strip of
+        thumbnails of the video, clicked to jump to a frame.
+        """
+        self.frm_timeline = tk.Frame(master=master)
+        self.frm_timeline.columnconfigure(0, weight=1)
+        self.frm_timeline.grid(row=3, column=0, sticky="nsew")
+
+        self.canvases["timeline"] = tk.Canvas(
+            master=self.frm_timeline,
+            height=int(self.timeline_prop * self.height),
+            bd=0, highlightthickness=0)
+        self.canvases["timeline"].grid(row=0, column=0, sticky="nsew")
+
+        scrollbar = tk.Scrollbar(
+            master=self.frm_timeline, orient=tk.HORIZONTAL, width=10,
+            command=self.canvases["timeline"].xview)
+        scrollbar.grid(row=1, column=0, sticky="nsew")
+        self.canvases["timeline"].configure(xscrollcommand=scrollbar.set)
+
+        self.timeline_items = {
+            "position": self.canvases["timeline"].create_rectangle(
+                0, 0, 0, 0, outline=self.timeline_color,
+                width=self.timeline_width, state="hidden")
+        }
+        # frame position of each thumbnail
+        self.timeline_frame_ids = []
+        # tk images of the thumbnails, kept from garbage collection
+        self.timeline_images = []
+
+    def set_thumbnails(self, thumbnails, frame_ids):
+        """Display the thumbnails of the video in the timeline.
+
+        Args:
+            thumbnails (list): RGB thumbnails, as np.ndarray
+            frame_ids (list): frame position of each thumbnail
+        """
+        self.clear_thumbnails()
+        canvas = self.canvases["timeline"]
+        height = int(self.timeline_prop * self.height)
+
+        x = 0
+        for thumbnail in thumbnails:
+            image = utils.resize_image(Image.fromarray(thumbnail), height)
+            image = ImageTk.PhotoImage(image)
+            canvas.create_image(x, 0, anchor="nw", image=image,
+                                tags="thumbnail")
+            self.timeline_images.append(image)
+            x += image.width()
+        self.timeline_frame_ids = list(frame_ids)
+        canvas.configure(scrollregion=(0, 0, x, height))
+        canvas.tag_raise(self.timeline_items["position"])
+
+    def clear_thumbnails(self):
+        """Remove the thumbnails from the timeline.
+        """
+        canvas = self.canvases["timeline"]
+        canvas.delete("thumbnail")
+        canvas.itemconfigure(self.timeline_items["position"], state="hidden")
+        self.timeline_frame_ids = []
+        self.timeline_images = []
+
+    def thumbnail_index(self, frame_number):
+        """Index of the last thumbnail at or before a frame
+        position, -1 if there is none.
+        """
+        return bisect.bisect_right(self.timeline_frame_ids, frame_number) - 1
+
+    def get_clicked_thumbnail(self, event):
+        """Get the frame position of the thumbnail under a click
+        on the timeline.
+
+        Args:
+            event (tk.Event): click event on the timeline canvas
+
+        Returns:
+            int: frame position, None if no thumbnail was clicked
+        """
+        if not self.timeline_images:
+            return None
+        width = self.timeline_images[0].width()
+        index = int(self.canvases["timeline"].canvasx(event.x) // width)
+        if 0 <= index < len(self.timeline_frame_ids):
+            return self.timeline_frame_ids[index]
+        return None
+
+    def show_timeline_position(self, frame_number):
+        """Outline the thumbnail of a frame position and scroll
+        the timeline to show it.
+
+        Args:
+            frame_number (int): frame position in the video
+        """
+        canvas = self.canvases["timeline"]
+        index = self.thumbnail_index(frame_number)
+        if index < 0 or not self.timeline_images:
+            canvas.itemconfigure(
+                self.timeline_items["position"], state="hidden")
+            return
+
+        width = self.timeline_images[0].width()
+        height = self.timeline_images[0].height()
+        inset = self.timeline_width // 2
+        canvas.coords(self.timeline_items["position"],
+                      index * width + inset, inset,
+                      (index + 1) * width - 1 - inset, height - 1 - inset)
+        canvas.itemconfigure(self.timeline_items["position"], state="normal")
+
+        # scroll so that the thumbnail is visible
+        total_width = width * len(self.timeline_images)
+        left, right = canvas.xview()
+        if not left <= index * width / total_width <= \
+                (index + 1) * width / total_width <= right:
+            canvas.xview_moveto(
+                max(index * width / total_width - (right - left) / 2, 0))
+
     def config_window(self):
         """Configure frame
         """
@@ -491,13 +637,16 @@ class VideoFrame(tk.Frame, ButtonsMixin):
         self.grid(row=0, column=0, sticky="nsew")
 
     def display_image(self, image):
-        """Plot image in label
+        """Plot image in canvas
         Args:
             image (PiL.Image)
         """
+        canvas = self.canvases["frame"]
+        width, height = image.size
         image = ImageTk.PhotoImage(image)
-        self.labels["frame"].configure(image=image)
-        self.labels["frame"].image = image
+        canvas.configure(width=width, height=height)
+        canvas.itemconfigure(self.canvas_items["frame"], image=image)
+        canvas.image = image
 
     def set_image(self, image,
                   top_left=None,
@@ -505,9 +654,9 @@ class VideoFrame(tk.Frame, ButtonsMixin):
         """Take a PIL image and save it
         as an attribute of the frame.
         Resize the image to img_prop * height.
-        Display the image in the label.
+        Display the image in the canvas.
 
-        Draw rectangle on image.
+        Draw rectangle over the image.
 
 
         Args:
@@ -524,24 +673,39 @@ class VideoFrame(tk.Frame, ButtonsMixin):
         self.image = image
         height = int(self.img_prop * self.height)
         image = utils.resize_image(image, height)
+        self.display_image(image)
+        self.displayed_size = image.size
 
         if top_left is not None and bottom_right is not None:
-            draw = ImageDraw.Draw(image)
-            width, height = image.size
+            self.draw_bbox(top_left, bottom_right)
 
-            top_left = tuple([
-                int(top_left[0] * width / 100),
-                int(top_left[1] * height / 100)
-            ])
+    def draw_bbox(self, top_left, bottom_right):
+        """Draw a rectangle over the displayed image.
+        Only the rectangle is updated, the image is
+        neither resized nor displayed again.
 
-            bottom_right = tuple([
-                int(bottom_right[0] * width / 100) - 1,
-                int(bottom_right[1] * height / 100)-1
-            ])
-
-            draw.rectangle([top_left, bottom_right],
-                           outline="red", width=3)
-        self.display_image(image)
+        Args:
+            top_left (tuple): top left corner of the rectangle.
+                Position is expressed as percentage of the image
+                width and height respectively.
+            bottom_right (tuple): bottom right corner of the rectangle.
+                Position is expressed as percentage of the image
+                width and height respectively.
+        """
+        width, height = self.displayed_size
+        # the outline is centered on the rectangle coordinates,
+        # shift it so that it is drawn inside the bounding box
+        inset = self.bbox_width // 2
+
+        self.canvases["frame"].coords(
+            self.canvas_items["bbox"],
+            int(top_left[0] * width / 100) + inset,
+            int(top_left[1] * height / 100) + inset,
+            int(bottom_right[0] * width / 100) - 1 - inset,
+            int(bottom_right[1] * height / 100) - 1 - inset
+        )
+        self.canvases["frame"].itemconfigure(
+            self.canvas_items["bbox"], state="normal")
 
     def update_video_list(self, options):
         """Update the list of options in the option
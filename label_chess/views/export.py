@@ -6,12 +6,19 @@ from tkinter import simpledialog
 from label_chess.views import config as cfg
 
 
+# export formats: csv files, or a memory mapped array
+# of resized board crops
+EXPORT_FORMATS = ["csv", "npy"]
+
+
 class ExportDialog(simpledialog.Dialog):
     def __init__(self, parent, title, options):
         """Custom simple dialog. Display a set
         of checkboxes horizontally and set the
         argument self.checks to the list of selected fields
         before being destroyed.
+        The export format is selected with radio buttons
+        and set to self.export_format.
 
         Args:
             parent (tk.Frame/tk.Tk/tk.TopLevel): the dialog is placed
@@ -24,6 +31,7 @@ class ExportDialog(simpledialog.Dialog):
         self.check_boxes = {}
         self.vars = {}
         self.checks = []
+        self.export_format = EXPORT_FORMATS[0]
         super().__init__(parent, title)
 
     def body(self, frame):
@@ -39,10 +47,22 @@ class ExportDialog(simpledialog.Dialog):
                                                       variable=self.vars[option])
             self.check_boxes[option].pack(fill=tk.BOTH)
 
+        self.formats = tk.LabelFrame(
+            master=frame, text="Format", **cfg.LBL_FRM())
+        self.formats.pack(fill=tk.BOTH)
+
+        # one radio button per export format
+        self.format_var = tk.StringVar(value=self.export_format)
+        for export_format in EXPORT_FORMATS:
+            tk.Radiobutton(self.formats, text=export_format,
+                           value=export_format,
+                           variable=self.format_var).pack(side="left")
+
         return frame
 
     def ok_pressed(self):
         self.checks = [k for k, v in self.vars.items() if v.get() == 1]
+        self.export_format = self.format_var.get()
         self.destroy()
 
     def cancel_pressed(self):
@@ -75,7 +95,8 @@ def export_dialog(parent=None, options=[]):
 
     Returns:
         list: selected options
+        str: selected export format (see EXPORT_FORMATS)
     """
     dialog = ExportDialog(title="Export annotations",
                           parent=parent, options=options)
-    return dialog.checks
+    return dialog.checks, dialog.export_format
@@ -14,6 +14,10 @@ class LoaderView(View):
         * a label
         * an entry labeled "URL (optional)
         * a button labeled "Add"
+        * a checkbox to build the proxies of the imported videos
+        * a button labeled "Import folder"
+        * the imports in progress, one label and one
+          "Cancel" button per import
 
         It is intended to select a file on disk (video, txt),
         join an optional attribute and save it to database.
@@ -39,6 +43,7 @@ class LoaderView(View):
         self.entries = {}
         self.buttons = {}
         self.labels = {}
+        self.bool_vars = {}
 
         self.config_window()
 
@@ -65,6 +70,57 @@ class LoaderView(View):
         self.buttons["Add"] = tk.Button(self, text="Add", **cfg.BTN())
         self.buttons["Add"].grid(row=3, column=0, sticky="nsew")
 
+        # proxies make the navigation faster but take several
+        # times the size of their video
+        self.bool_vars["build_proxy"] = tk.BooleanVar(self, value=False)
+        self.buttons["build_proxy"] = tk.Checkbutton(
+            self, text="Build proxies of the videos for a faster navigation "
+                       "(several times the size of the video)",
+            variable=self.bool_vars["build_proxy"])
+        self.buttons["build_proxy"].grid(row=4, column=0, sticky="nsew")
+
+        # import all the videos and pgn files of a folder
+        self.buttons["import_folder"] = tk.Button(
+            self, text="Import folder", **cfg.BTN())
+        self.buttons["import_folder"].grid(row=5, column=0, sticky="nsew")
+
+        # imports in progress
+        self.frm_imports = self.create_label_frame("Imports")
+        self.frm_imports.grid(row=6, column=0, sticky="nsew")
+
+    def add_import_row(self, import_id, text):
+        """Display an import in progress: a label with
+        its progress and a button to cancel it.
+
+        Args:
+            import_id (int)
+            text (str): progress text
+
+        Returns:
+            tk.Button: the cancel button
+        """
+        row = tk.Frame(self.frm_imports)
+        row.columnconfigure(0, weight=1)
+        row.pack(fill=tk.X)
+
+        self.labels[f"import_{import_id}"] = tk.Label(
+            row, text=text, anchor="w")
+        self.labels[f"import_{import_id}"].grid(row=0, column=0, sticky="nsew")
+        self.buttons[f"cancel_{import_id}"] = tk.Button(
+            row, text="Cancel", **cfg.BTN())
+        self.buttons[f"cancel_{import_id}"].grid(
+            row=0, column=1, sticky="nsew")
+        return self.buttons[f"cancel_{import_id}"]
+
+    def update_import_row(self, import_id, text):
+        self.labels[f"import_{import_id}"].configure(text=text)
+
+    def remove_import_row(self, import_id):
+        label = self.labels.pop(f"import_{import_id}")
+        self.buttons.pop(f"cancel_{import_id}")
+        # destroy the row frame with its widgets
+        label.master.destroy()
+
     def create_label_frame(self, text):
         frm = tk.LabelFrame(self, text=text, **cfg.LBL_FRM())
         frm.columnconfigure(0, weight=1)
@@ -81,7 +137,7 @@ class LoaderView(View):
         self.master.title(f"Add {self.add_name} to database")
 
         self.columnconfigure(0, weight=1)
-        self.rowconfigure([0, 1, 2, 3], weight=1)
+        self.rowconfigure([0, 1, 2, 3, 4, 5, 6], weight=1)
         self.grid(row=0, column=0, sticky="nsew")
 
 
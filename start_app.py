@@ -4,9 +4,12 @@
 from label_chess import models
 from label_chess.app import ChessAnnotatorApp
 import argparse
+import multiprocessing
 
 
 if __name__ == "__main__":
+    # spawned dataset workers of a frozen binary run this entry point
+    multiprocessing.freeze_support()
     parser = argparse.ArgumentParser()
     parser.add_argument(
         '-r', "--reset_db", help='Clear database',
@@ -0,0 +1,40 @@
+import cv2
+import numpy as np
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import Session
+
+from label_chess import models
+
+
+@pytest.fixture
+def db():
+    """Session of an in-memory database with the tables
+    of the models.
+    """
+    engine = create_engine("sqlite://")
+    models.BASE.metadata.create_all(engine)
+    session = Session(bind=engine)
+    yield session
+    session.close()
+
+
+@pytest.fixture
+def write_video():
+    """Function writing a test video whose frame i is filled
+    with the value 4 * i, on top of a moving noise pattern if
+    noise is True (so that the encoder doesn't only produce
+    keyframes).
+    """
+    def write(path, nb_frames, width=64, height=48, noise=True):
+        pattern = np.zeros((height, width, 3), dtype=np.uint8)
+        if noise:
+            pattern = np.random.default_rng(0).integers(
+                0, 32, (height, width, 3), dtype=np.uint8)
+        writer = cv2.VideoWriter(
+            str(path), cv2.VideoWriter_fourcc(*"mp4v"), 25, (width, height))
+        for i in range(nb_frames):
+            writer.write(np.roll(pattern, i, axis=1) + 4 * i)
+        writer.release()
+        return str(path)
+    return write
@@ -0,0 +1,65 @@
+import cv2
+import numpy as np
+
+from label_chess import dataset
+
+
+def test_crop_bbox():
+    frame = np.arange(40 * 20).reshape(20, 40)[..., None].repeat(3, axis=2)
+
+    crop = dataset.crop_bbox(frame, [25, 50, 50, 100])
+
+    assert crop.shape == (10, 10, 3)
+    assert (crop[0, 0] == frame[10, 10]).all()
+
+
+def test_extract_crops(tmp_path, write_video):
+    task = {
+        "video_url": "url",
+        "video_path": write_video(tmp_path / "video.mp4", 30, noise=False),
+        "index_path": None,
+        "frames": [
+            {"frame_id": frame_id, "fen": f"fen{frame_id}",
+             "annotation": annotation, "top_left_x": 0, "top_left_y": 0,
+             "bottom_right_x": 50, "bottom_right_y": 50}
+            for frame_id, annotation in [(2, "a"), (2, "b"), (20, "a")]]
+    }
+    # empty bounding box
+    task["frames"].append({**task["frames"][0], "frame_id": 5,
+                           "bottom_right_x": 0})
+
+    rows, missing = dataset.extract_crops(task, str(tmp_path / "dataset"))
+
+    assert [row["image"] for row in rows] == [
+        "images/a/000002.png", "images/b/000002.png", "images/a/000020.png"]
+    crop = cv2.imread(str(tmp_path / "dataset" / rows[2]["image"]))
+    assert crop.shape == (24, 32, 3)
+    assert abs(crop.mean() - 80) < 4
+    assert [row["frame_id"] for row in missing] == [5]
+    assert not (tmp_path / "dataset" / "images" / "a" / "000005.png").exists()
+
+
+def test_write_array_crops(tmp_path, write_video):
+    task = {
+        "video_url": "url",
+        "video_path": write_video(tmp_path / "video.mp4", 30, noise=False),
+        "index_path": None,
+        "offset": 1,
+        "frames": [
+            {"frame_id": frame_id, "fen": "8/8/8/8/8/8/8/K6k",
+             "annotation": "a", "top_left_x": 0, "top_left_y": 0,
+             "bottom_right_x": 50, "bottom_right_y": 50}
+            for frame_id in [5, 20, 100]]
+    }
+    images_path = str(tmp_path / "images.npy")
+    np.lib.format.open_memmap(
+        images_path, mode="w+", dtype=np.uint8, shape=(4, 16, 16, 3)).flush()
+
+    missing = dataset.write_array_crops(task, images_path, 16)
+
+    images = np.load(images_path, mmap_mode="r")
+    # frame 100 is past the end of the video
+    assert missing == [3]
+    assert images[0].max() == 0
+    assert abs(images[1].mean() - 20) < 4
+    assert abs(images[2].mean() - 80) < 4
@@ -0,0 +1,149 @@
+import hashlib
+import http.server
+import threading
+
+import pytest
+
+from label_chess import download
+
+
+CONTENT = bytes(range(256)) * 400
+ETAG = '"v1"'
+
+
+class Handler(http.server.BaseHTTPRequestHandler):
+    """Serve CONTENT with an ETag, honoring Range (416 past
+    the end), If-Range and If-None-Match.
+    """
+    requests = []
+
+    def do_GET(self):
+        Handler.requests.append(dict(self.headers))
+        content, etag = self.server.content, self.server.etag
+
+        if self.headers.get("If-None-Match") == etag:
+            self.send_response(304)
+            self.end_headers()
+            return
+
+        start = 0
+        byte_range = self.headers.get("Range")
+        if byte_range and self.headers.get("If-Range", etag) == etag:
+            start = int(byte_range.split("=")[1].split("-")[0])
+            if start >= len(content):
+                self.send_response(416)
+                self.send_header("Content-Range", f"bytes */{len(content)}")
+                self.send_header("Content-Length", "0")
+                self.end_headers()
+                return
+            self.send_response(206)
+            self.send_header(
+                "Content-Range",
+                f"bytes {start}-{len(content) - 1}/{len(content)}")
+        else:
+            self.send_response(200)
+        self.send_header("ETag", etag)
+        self.send_header("Content-Length", str(len(content) - start))
+        self.end_headers()
+        self.wfile.write(content[start:])
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def server():
+    Handler.requests = []
+    server = http.server.ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    server.content, server.etag = CONTENT, ETAG
+    thread = threading.Thread(
+        target=server.serve_forever, kwargs={"poll_interval": 0.01},
+        daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+def get_url(server):
+    return f"http://127.0.0.1:{server.server_address[1]}/game.pgn"
+
+
+def test_download_records_checksum(server, tmp_path):
+    save_path = str(tmp_path / "game.pgn")
+    downloader = download.Downloader(chunk_size=1000)
+
+    meta = downloader.download(get_url(server), save_path)
+
+    with open(save_path, "rb") as saved:
+        assert saved.read() == CONTENT
+    assert meta["fetched"]
+    assert meta["sha256"] == hashlib.sha256(CONTENT).hexdigest()
+    assert downloader.load_meta(save_path)["etag"] == ETAG
+
+
+def test_download_skips_unchanged_file(server, tmp_path):
+    save_path = str(tmp_path / "game.pgn")
+    downloader = download.Downloader()
+
+    downloader.download(get_url(server), save_path)
+    meta = downloader.download(get_url(server), save_path)
+
+    assert not meta["fetched"]
+    assert Handler.requests[-1]["If-None-Match"] == ETAG
+    assert meta["sha256"] == hashlib.sha256(CONTENT).hexdigest()
+
+
+def test_download_resumes_partial_file(server, tmp_path):
+    save_path = str(tmp_path / "game.pgn")
+    downloader = download.Downloader()
+    with open(f"{save_path}.part", "wb") as part_file:
+        part_file.write(CONTENT[:5000])
+    downloader.save_meta(save_path, {"etag": ETAG, "complete": False})
+
+    meta = downloader.download(get_url(server), save_path)
+
+    assert Handler.requests[-1]["Range"] == "bytes=5000-"
+    with open(save_path, "rb") as saved:
+        assert saved.read() == CONTENT
+    assert meta["sha256"] == hashlib.sha256(CONTENT).hexdigest()
+
+
+def test_download_complete_part_file(server, tmp_path):
+    save_path = str(tmp_path / "game.pgn")
+    downloader = download.Downloader()
+    # stopped after writing the whole file, before renaming it
+    with open(f"{save_path}.part", "wb") as part_file:
+        part_file.write(CONTENT)
+    downloader.save_meta(save_path, {"etag": ETAG, "complete": False})
+
+    meta = downloader.download(get_url(server), save_path)
+
+    assert "Range" not in Handler.requests[-1]
+    with open(save_path, "rb") as saved:
+        assert saved.read() == CONTENT
+    assert meta["complete"]
+
+
+def test_download_restarts_when_file_changed(server, tmp_path):
+    save_path = str(tmp_path / "game.pgn")
+    downloader = download.Downloader()
+    with open(f"{save_path}.part", "wb") as part_file:
+        part_file.write(b"stale content")
+    downloader.save_meta(save_path, {"etag": '"v0"', "complete": False})
+
+    downloader.download(get_url(server), save_path)
+
+    with open(save_path, "rb") as saved:
+        assert saved.read() == CONTENT
+
+
+def test_forget_removes_metadata(server, tmp_path):
+    save_path = str(tmp_path / "game.pgn")
+    downloader = download.Downloader()
+    downloader.download(get_url(server), save_path)
+
+    downloader.forget(save_path)
+    downloader.forget(save_path)
+
+    assert downloader.load_meta(save_path) == {}
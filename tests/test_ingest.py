@@ -0,0 +1,96 @@
+import csv
+
+from label_chess import ingest, models
+
+
+FRAMES = [
+    {"frame_id": 3, "fen": "8/8/8/8/8/8/8/K6k", "top_left_x": 1,
+     "top_left_y": 2, "bottom_right_x": 30, "bottom_right_y": 40},
+    {"frame_id": 1, "fen": "8/8/8/8/8/8/8/k6K", "top_left_x": 5,
+     "top_left_y": 6, "bottom_right_x": 70, "bottom_right_y": 80},
+]
+
+
+def test_annotation_frames_roundtrip(tmp_path, db):
+    ann = ingest.add_annotation(
+        db, models.Annotation(video_url="video", name="ann"), FRAMES)
+
+    assert ingest.load_annotation_frames(db, ann) == FRAMES
+    # frames can be queried across annotations
+    frames = db.query(models.AnnotationFrame) \
+        .filter_by(fen=FRAMES[1]["fen"]).all()
+    assert [frame.frame_id for frame in frames] == [1]
+
+    csv_path = tmp_path / "ann.csv"
+    ingest.export_annotation_csv(db, ann, csv_path)
+    with open(csv_path, newline="") as csv_file:
+        rows = list(csv.DictReader(csv_file))
+    assert [row["fen"] for row in rows] == [f["fen"] for f in FRAMES]
+    assert list(rows[0]) == ingest.ANNOTATION_COLUMNS
+
+
+def test_index_legacy_annotations(tmp_path, db):
+    csv_path = tmp_path / "legacy.csv"
+    with open(csv_path, "w", newline="") as csv_file:
+        writer = csv.DictWriter(csv_file, fieldnames=ingest.ANNOTATION_COLUMNS)
+        writer.writeheader()
+        writer.writerows(FRAMES)
+    db.add(models.Annotation(video_url="video", csv_path=str(csv_path)))
+    db.commit()
+
+    ingest.index_legacy_annotations(db)
+    ingest.index_legacy_annotations(db)
+
+    ann = db.query(models.Annotation).one()
+    assert ann.name == "legacy"
+    assert ingest.load_annotation_frames(db, ann) == FRAMES
+
+
+def test_index_legacy_annotations_name_taken(tmp_path, db):
+    csv_path = tmp_path / "legacy.csv"
+    with open(csv_path, "w", newline="") as csv_file:
+        writer = csv.DictWriter(csv_file, fieldnames=ingest.ANNOTATION_COLUMNS)
+        writer.writeheader()
+    db.add(models.Annotation(video_url="video", name="legacy"))
+    db.add(models.Annotation(video_url="video", csv_path=str(csv_path)))
+    db.commit()
+
+    ingest.index_legacy_annotations(db)
+
+    names = [name for name, in db.query(models.Annotation.name)
+             .order_by(models.Annotation.id)]
+    assert names == ["legacy", "legacy_2"]
+
+
+def test_discover_and_pair_files(tmp_path):
+    for name in ["Round 1.mp4", "sub/round_1.PGN", "round_2.mp4",
+                 "round_3.pgn", "notes.txt"]:
+        path = tmp_path / name
+        path.parent.mkdir(exist_ok=True)
+        path.write_bytes(b"")
+
+    found = ingest.discover_files(str(tmp_path))
+    pairs, unpaired = ingest.pair_files(found[".mp4"], found[".pgn"])
+
+    assert found == {
+        ".mp4": [str(tmp_path / "Round 1.mp4"), str(tmp_path / "round_2.mp4")],
+        ".pgn": [str(tmp_path / "round_3.pgn"),
+                 str(tmp_path / "sub/round_1.PGN")]}
+    assert pairs == [(str(tmp_path / "Round 1.mp4"),
+                      str(tmp_path / "sub/round_1.PGN"))]
+    assert sorted(unpaired) == [str(tmp_path / "round_2.mp4"),
+                                str(tmp_path / "round_3.pgn")]
+
+
+def test_thumbnails_of_unindexed_video(tmp_path, monkeypatch, db, write_video):
+    monkeypatch.setattr(models, "INDEX_DATA_DIR", str(tmp_path))
+    video = models.Video(url="url", name="video.mp4",
+                         path=write_video(tmp_path / "video.mp4", 30))
+    db.add(video)
+
+    thumbnails_path, index = ingest.build_missing_thumbnails(
+        video, video.path, indexed=False)
+    ingest.add_thumbnails(db, video, thumbnails_path, index)
+
+    assert ingest.load_thumbnails_path(db, video) == thumbnails_path
+    assert db.query(models.VideoIndex).get("url").nb_frames == 30
@@ -0,0 +1,98 @@
+import pytest
+from sqlalchemy import create_engine, text
+from sqlalchemy.orm import sessionmaker
+
+from label_chess import models
+
+
+def add_videos(db, nb_videos):
+    db.add_all([models.Video(url=f"url{i}", name=f"name{i}.mp4")
+                for i in range(nb_videos)])
+    db.commit()
+
+
+def test_file_exists(db):
+    add_videos(db, 3)
+
+    assert models.file_exists(db, models.Video, "url1", "new.mp4")
+    assert models.file_exists(db, models.Video, "new", "name2.mp4")
+    assert not models.file_exists(db, models.Video, "new", "new.mp4")
+    assert not models.file_exists(db, models.PGN, "url1", "name1.mp4")
+
+
+def test_files_exist(db):
+    add_videos(db, 1000)
+
+    # more pairs than sqlite's parameter limit
+    pairs = [(f"url{i}", "new.mp4") for i in range(0, 2000, 2)] + \
+        [("new", f"name{i}.mp4") for i in range(0, 2000, 2)]
+    expected = [i < 1000 for i in range(0, 2000, 2)] * 2
+
+    assert models.files_exist(db, models.Video, pairs) == expected
+    assert models.files_exist(db, models.Video, []) == []
+
+
+def make_file_engine(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path}/db.sqlite")
+    models.tune_sqlite(engine)
+    models.BASE.metadata.create_all(engine)
+    return engine
+
+
+def test_session_scope(tmp_path):
+    factory = sessionmaker(bind=make_file_engine(tmp_path))
+
+    with models.session_scope(factory) as db:
+        db.add(models.Video(url="url", name="name.mp4"))
+    with pytest.raises(ValueError):
+        with models.session_scope(factory) as db:
+            db.add(models.Video(url="other", name="other.mp4"))
+            raise ValueError
+
+    with models.session_scope(factory) as db:
+        assert [v.url for v in db.query(models.Video)] == ["url"]
+
+
+def test_readers_and_writer_coexist(tmp_path):
+    engine = make_file_engine(tmp_path)
+    with engine.connect() as connection:
+        mode = connection.execute(text("PRAGMA journal_mode")).scalar()
+    assert mode == "wal"
+
+    factory = sessionmaker(bind=engine)
+    with models.session_scope(factory) as writer:
+        writer.add(models.Video(url="url", name="name.mp4"))
+        writer.flush()
+        # the writer holds its write lock, a reader sees
+        # the last committed state without waiting
+        with models.session_scope(factory) as reader:
+            assert reader.query(models.Video).count() == 0
+    with models.session_scope(factory) as reader:
+        assert reader.query(models.Video).count() == 1
+
+
+def test_bulk_insert(db):
+    rows = ({"url": f"url{i}", "name": f"name{i}.pgn"} for i in range(25))
+
+    assert models.bulk_insert(db, models.PGN, rows, chunk_size=10) == 25
+    assert db.query(models.PGN).count() == 25
+
+
+def test_add_missing_columns_keeps_unique(tmp_path, monkeypatch):
+    engine = create_engine(f"sqlite:///{tmp_path}/db.sqlite")
+    with engine.begin() as connection:
+        # annotation table of an older version, without names
+        connection.execute(text(
+            "CREATE TABLE annotation (id INTEGER PRIMARY KEY, "
+            "video_url VARCHAR, pgn_url VARCHAR, csv_path VARCHAR)"))
+    models.BASE.metadata.create_all(engine)
+    monkeypatch.setattr(models, "ENGINE", engine)
+
+    models.add_missing_columns()
+
+    with engine.begin() as connection:
+        connection.execute(text(
+            "INSERT INTO annotation (name) VALUES ('a'), (NULL), (NULL)"))
+        with pytest.raises(Exception):
+            connection.execute(text(
+                "INSERT INTO annotation (name) VALUES ('a')"))
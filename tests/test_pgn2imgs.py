@@ -0,0 +1,90 @@
+from label_chess import pgn2imgs
+from fen2pil import draw
+
+
+GAME = """[Event "Test"]
+[White "White"]
+[Black "Black"]
+[Result "*"]
+
+1. e4 e5 2. Nf3 Nc6 3. Bb5 a6 4. Ba4 Nf6 *
+"""
+
+
+def write_pgn(path, content=GAME):
+    with open(path, "w") as pgn_file:
+        pgn_file.write(content)
+    return str(path)
+
+
+def test_pgn_to_fens(tmp_path):
+    pgn_path = write_pgn(tmp_path / "game.pgn")
+
+    fens = pgn2imgs.pgn_to_fens(pgn_path)
+
+    assert len(fens) == 9
+    assert fens[0] == "rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP/RNBQKBNR"
+    assert fens[1] == "rnbqkbnr/pppppppp/8/8/4P3/8/PPPP1PPP/RNBQKBNR"
+
+
+def test_board_images_are_rendered_lazily(tmp_path):
+    pgn_path = write_pgn(tmp_path / "game.pgn")
+
+    images = pgn2imgs.BoardImages(
+        pgn2imgs.pgn_to_fens(pgn_path), board_size=80, window=3, prefetch=2)
+    assert len(images) == 9
+    assert len(images.images) == 0
+
+    for index in range(len(images)):
+        fen, image = images[index]
+        expected = draw.transform_fen_pil(fen=fen, board_size=80)
+        assert fen == images.get_fen(index)
+        assert image.tobytes() == expected.tobytes()
+        assert len(images.images) <= 3
+
+    images.close()
+
+
+def test_fen_to_codes():
+    codes = pgn2imgs.fen_to_codes(
+        "rnbqkbnr/pppppppp/8/8/4P3/8/PPPP1PPP/RNBQKBNR b KQkq - 0 1")
+
+    assert pgn2imgs.PIECES[codes[0, 0]] == "r"
+    assert pgn2imgs.PIECES[codes[4, 4]] == "P"
+    assert codes[6, 4] == 0
+    assert (codes[2:4] == 0).all()
+
+
+def test_board_renderer_matches_fen2pil(tmp_path):
+    pgn_path = write_pgn(tmp_path / "game.pgn")
+    renderer = pgn2imgs.BoardRenderer(board_size=160)
+
+    fens = pgn2imgs.pgn_to_fens(pgn_path)
+    # render out of order so that several squares change at once
+    for fen in fens + fens[::-3]:
+        expected = draw.transform_fen_pil(fen=fen, board_size=160)
+        assert renderer.render(fen).tobytes() == expected.tobytes()
+
+
+def test_index_pgn_games(tmp_path):
+    second_game = GAME.replace('"White"', '"Second"').replace(
+        "1. e4 e5", "1. d4 d5")
+    pgn_path = write_pgn(tmp_path / "games.pgn", GAME + "\n" + second_game)
+
+    games = list(pgn2imgs.index_pgn_games(pgn_path))
+
+    assert [game["white"] for game in games] == ["White", "Second"]
+    fens = pgn2imgs.pgn_to_fens(pgn_path, games[1]["offset"])
+    assert fens[1] == "rnbqkbnr/pppppppp/8/8/3P4/8/PPP1PPPP/RNBQKBNR"
+    assert pgn2imgs.pgn_to_fens(pgn_path, games[0]["offset"]) == \
+        pgn2imgs.pgn_to_fens(pgn_path)
+
+
+def test_index_pgn_games_with_fens(tmp_path):
+    pgn_path = write_pgn(tmp_path / "games.pgn", GAME + "\n" + GAME)
+
+    games = list(pgn2imgs.index_pgn_games(pgn_path, with_fens=True))
+
+    assert len(games) == 2
+    for game in games:
+        assert game["fens"] == pgn2imgs.pgn_to_fens(pgn_path, game["offset"])
@@ -0,0 +1,55 @@
+import os
+
+import pytest
+
+from label_chess import storage
+
+
+def write_file(path, content=b"1. e4 e5 *\n"):
+    with open(path, "wb") as out:
+        out.write(content)
+    return str(path)
+
+
+def test_store_file_deduplicates(tmp_path):
+    blob_dir = str(tmp_path / "blobs")
+    first = write_file(tmp_path / "first.PGN")
+    second = write_file(tmp_path / "second.pgn")
+
+    blob = storage.store_file(first, blob_dir=blob_dir)
+    same_blob = storage.store_file(second, blob_dir=blob_dir)
+
+    assert blob == same_blob
+    assert blob["path"].endswith(f"{blob['digest']}.pgn")
+    assert blob["size"] == os.path.getsize(first)
+    assert os.path.exists(first) and os.path.exists(second)
+    assert len(os.listdir(os.path.dirname(blob["path"]))) == 1
+    assert storage.stored_blob(blob["path"]) == blob
+
+
+def test_store_file_moves(tmp_path):
+    blob_dir = str(tmp_path / "blobs")
+    path = write_file(tmp_path / "game.pgn")
+
+    blob = storage.store_file(path, move=True, blob_dir=blob_dir)
+
+    assert not os.path.exists(path)
+    with open(blob["path"], "rb") as stored:
+        assert stored.read() == b"1. e4 e5 *\n"
+
+
+@pytest.mark.parametrize("copy", [
+    storage.cheap_copy, storage.reflink, storage.copy_range])
+def test_copies(tmp_path, copy):
+    content = os.urandom(3 * 1024 ** 2 + 7)
+    src = write_file(tmp_path / "src", content)
+    dst = str(tmp_path / "dst")
+
+    try:
+        copy(src, dst)
+    except OSError:
+        # not supported by this file system
+        assert not os.path.exists(dst)
+        return
+    with open(dst, "rb") as copied:
+        assert copied.read() == content
@@ -0,0 +1,39 @@
+import threading
+
+from label_chess import storage
+from label_chess.tasks import BackgroundTask
+
+
+def test_background_task_reports_progress():
+    started = threading.Event()
+    resume = threading.Event()
+
+    def target(progress):
+        progress("hash", 50, 200)
+        started.set()
+        resume.wait()
+        progress("copy", 200, 200)
+
+    task = BackgroundTask("game.pgn", target)
+    task.start()
+    started.wait()
+
+    assert task.describe() == "game.pgn: hash 25%"
+    resume.set()
+    task.thread.join()
+    assert task.done and task.error is None and not task.cancelled
+
+
+def test_background_task_cancel(tmp_path):
+    path = tmp_path / "game.pgn"
+    path.write_bytes(b"1. e4 *\n" * 1024)
+    blob_dir = tmp_path / "blobs"
+
+    task = BackgroundTask("game.pgn", lambda progress: storage.store_file(
+        str(path), blob_dir=str(blob_dir), progress=progress))
+    task.cancel()
+    task.start()
+    task.thread.join()
+
+    assert task.done and task.cancelled and task.error is None
+    assert not blob_dir.exists() or not any(blob_dir.rglob("*.pgn"))
@@ -1,5 +1,8 @@
-from label_chess import utils 
+from label_chess import pgn2imgs, utils
 from PIL import Image
+import numpy as np
+import chess
+import cv2
 
 
 def test_resize_image():
@@ -13,4 +16,237 @@ def test_resize_image():
     r_width, r_height = img.size 
 
     assert expected_height == r_height 
-    assert round(expected_ratio, 2) == round(r_height / r_width , 2)
\ No newline at end of file
+    assert round(expected_ratio, 2) == round(r_height / r_width , 2)
+
+def test_frame_cache_evicts_least_recently_used():
+    frame = np.zeros((10, 10, 3), dtype=np.uint8)
+    cache = utils.FrameCache(max_bytes=3 * frame.nbytes)
+
+    for frame_id in range(3):
+        cache.put(frame_id, frame.copy())
+    # frame 0 becomes the most recently used
+    assert cache.get(0) is not None
+
+    cache.put(3, frame.copy())
+
+    assert 1 not in cache
+    assert 0 in cache and 2 in cache and 3 in cache
+    assert cache.nbytes == 3 * frame.nbytes
+
+
+def test_frame_cache_skips_frames_over_budget():
+    frame = np.zeros((10, 10, 3), dtype=np.uint8)
+    cache = utils.FrameCache(max_bytes=frame.nbytes - 1)
+
+    cache.put(0, frame)
+
+    assert len(cache) == 0
+    assert cache.get(0) is None
+
+
+def test_frame_prefetcher_honors_fps_ratio(tmp_path, write_video):
+    video_path = write_video(tmp_path / "video.mp4", nb_frames=20)
+
+    prefetcher = utils.FramePrefetcher(video_path, fps_ratio=5, depth=2)
+    frame_ids = []
+    try:
+        while True:
+            frame_id, frame = prefetcher.get()
+            frame_ids.append(frame_id)
+            assert frame.shape == (48, 64, 3)
+    except StopIteration:
+        pass
+    prefetcher.stop()
+
+    assert frame_ids == [0, 5, 10, 15]
+
+
+def test_frame_prefetcher_stops_while_queue_is_full(tmp_path, write_video):
+    video_path = write_video(tmp_path / "video.mp4", nb_frames=20)
+
+    prefetcher = utils.FramePrefetcher(video_path, depth=1)
+    prefetcher.get()
+    prefetcher.stop()
+
+    assert not prefetcher.thread.is_alive()
+
+
+def test_video_index_roundtrip(tmp_path, write_video):
+    video_path = write_video(tmp_path / "video.mp4", nb_frames=30)
+
+    keyframes, timestamps = utils.build_video_index(video_path)
+    index_path = str(tmp_path / "video.npz")
+    utils.save_video_index(index_path, keyframes, timestamps)
+    loaded_keyframes, loaded_timestamps = utils.load_video_index(index_path)
+
+    assert len(timestamps) == 30
+    assert np.all(np.diff(timestamps) > 0)
+    if len(keyframes):
+        assert keyframes[0] == 0
+        assert len(keyframes) < 30
+    assert np.array_equal(keyframes, loaded_keyframes)
+    assert np.array_equal(timestamps, loaded_timestamps)
+
+
+def test_get_video_frame_with_keyframes(tmp_path, write_video):
+    video_path = write_video(tmp_path / "video.mp4", nb_frames=40)
+    keyframes, _ = utils.build_video_index(video_path)
+
+    frame_ids = [0, 3, 7, 20, 21, 35, 2, 39]
+    video = utils.load_video(video_path)
+    expected = []
+    last_frame_id = -1
+    for frame_id in frame_ids:
+        expected.append(utils.get_video_frame(video, frame_id, last_frame_id))
+        last_frame_id = frame_id
+
+    video = utils.load_video(video_path)
+    last_frame_id = -1
+    for frame_id, expected_frame in zip(frame_ids, expected):
+        frame = utils.get_video_frame(
+            video, frame_id, last_frame_id, keyframes)
+        last_frame_id = frame_id
+        assert np.array_equal(frame, expected_frame)
+
+
+def test_get_video_frames(tmp_path, write_video):
+    video_path = write_video(tmp_path / "video.mp4", 60)
+    keyframes, _ = utils.build_video_index(video_path)
+    frame_ids = [50, 3, 3, 20, 4, 54, 100, 21]
+
+    for index in (None, keyframes):
+        video = utils.load_video(video_path)
+        frames = list(utils.get_video_frames(video, frame_ids, index))
+        video.release()
+
+        assert len(frames) == len(frame_ids)
+        assert frames[6] is None
+        for frame_id, frame in zip(frame_ids, frames):
+            if frame_id < 100:
+                assert abs(frame.mean() - 4 * frame_id - 16) < 4
+
+
+def test_plan_seek():
+    keyframes = np.arange(0, 100, 12)
+
+    # backwards
+    assert utils.plan_seek(50, 30, keyframes) == 30
+    # in the current group of pictures
+    assert utils.plan_seek(25, 30, keyframes) is None
+    # the decoder restarts from 24, closer than the current position
+    assert utils.plan_seek(2, 40, keyframes) == 40
+    # the decoder would restart from 24, before the current position
+    assert utils.plan_seek(37, 47, keyframes) is None
+    assert utils.plan_seek(13, 24, keyframes) is None
+
+
+def test_frames_from_video_generator(tmp_path, write_video):
+    video_path = write_video(tmp_path / "video.mp4", 50)
+
+    frames = list(utils.frames_from_video_generator(video_path, 3))
+    parallel_frames = list(utils.frames_from_video_generator(
+        video_path, 3, workers=2, segment_size=10))
+
+    assert [number for _, number in frames] == list(range(0, 50, 3))
+    assert [number for _, number in parallel_frames] == list(range(0, 50, 3))
+    for (frame, number), (parallel_frame, _) in zip(frames, parallel_frames):
+        assert abs(frame.mean() - 4 * number - 16) < 4
+        assert np.array_equal(frame, parallel_frame)
+
+    # seeking over groups of pictures gives the same frames
+    keyframes, _ = utils.build_video_index(video_path)
+    strided = list(utils.frames_from_video_generator(video_path, 20))
+    seeked = list(utils.frames_from_video_generator(
+        video_path, 20, keyframes=keyframes))
+    assert [number for _, number in seeked] == [0, 20, 40]
+    for (frame, _), (seeked_frame, _) in zip(strided, seeked):
+        assert np.array_equal(frame, seeked_frame)
+
+    # the consumer stops before the end of the video
+    generator = utils.frames_from_video_generator(
+        video_path, 1, workers=2, segment_size=4)
+    assert [number for _, (_, number) in zip(range(6), generator)] == \
+        list(range(6))
+    generator.close()
+
+
+def test_build_proxy_video(tmp_path, write_video):
+    video_path = write_video(tmp_path / "video.mp4", 30, width=128, height=96)
+    proxy_path = str(tmp_path / "proxy.avi")
+
+    nb_frames = utils.build_proxy_video(video_path, proxy_path, height=48)
+
+    proxy = utils.load_video(proxy_path)
+    assert nb_frames == 30
+    assert int(proxy.get(cv2.CAP_PROP_FRAME_COUNT)) == 30
+    frame, = utils.get_video_frames(proxy, [17], np.arange(nb_frames))
+    proxy.release()
+    assert frame.shape == (48, 64, 3)
+    assert abs(frame.mean() - 4 * 17 - 16) < 4
+
+
+def test_thumbnail_sheet_roundtrip(tmp_path, write_video):
+    # 25 fps: one thumbnail every 10 frames
+    video_path = write_video(tmp_path / "video.mp4", 50, width=96, height=64)
+    sheet_path = str(tmp_path / "thumbs.npz")
+
+    sheet, frame_ids, size = utils.build_thumbnail_sheet(
+        video_path, interval=0.4, height=16, columns=2)
+    utils.save_thumbnail_sheet(sheet_path, sheet, frame_ids, size)
+    thumbnails, loaded_ids = utils.load_thumbnails(sheet_path)
+
+    assert size == (24, 16)
+    assert sheet.shape == (3 * 16, 2 * 24, 3)
+    assert list(loaded_ids) == [0, 10, 20, 30, 40]
+    assert [thumbnail.shape for thumbnail in thumbnails] == [(16, 24, 3)] * 5
+    # thumbnail of frame i is filled with 4 * i + noise
+    assert abs(thumbnails[3].mean() - 4 * 30 - 16) < 4
+
+
+def test_find_next_change(tmp_path):
+    renderer = pgn2imgs.BoardRenderer(board_size=160)
+    start = np.array(renderer.render(chess.STARTING_FEN))
+    # 1. e4: a single move changes 2 of the 64 squares
+    board = chess.Board()
+    board.push_san("e4")
+    moved = np.array(renderer.render(board.fen()))
+
+    writer = cv2.VideoWriter(str(tmp_path / "video.mp4"),
+                             cv2.VideoWriter_fourcc(*"mp4v"), 25, (224, 176))
+    for i in range(40):
+        frame = np.full((176, 224, 3), 64, dtype=np.uint8)
+        frame[8:168, 8:168] = moved if i >= 23 else start
+        # change outside of the board
+        if i >= 10:
+            frame[:, 176:] = 255
+        writer.write(cv2.cvtColor(frame, cv2.COLOR_RGB2BGR))
+    writer.release()
+    video_path = str(tmp_path / "video.mp4")
+    reference = np.full((176, 224, 3), 64, dtype=np.uint8)
+    reference[8:168, 8:168] = start
+    box = (8, 8, 168, 168)
+
+    assert utils.find_next_change(video_path, 0, reference, box) == 23
+    # only sampled frames are compared
+    assert utils.find_next_change(
+        video_path, 0, reference, box, fps_ratio=5) == 25
+    assert utils.find_next_change(
+        video_path, 0, reference, (176, 0, 224, 176)) == 10
+    assert utils.find_next_change(
+        video_path, 23, reference, (8, 8, 168, 88)) is None
+
+
+def test_build_proxy_video_cancel(tmp_path, write_video):
+    video_path = write_video(tmp_path / "video.mp4", 30)
+    proxy_path = tmp_path / "proxy.avi"
+
+    def progress(stage, done, total):
+        assert (stage, total) == ("proxy", 30)
+        if done == 5:
+            raise KeyboardInterrupt
+
+    try:
+        utils.build_proxy_video(video_path, str(proxy_path), progress=progress)
+    except KeyboardInterrupt:
+        pass
+    assert not proxy_path.exists()